@@ -3,7 +3,7 @@ from flask import current_app
 from flask.cli import with_appcontext
 
 from .extensions import db
-from .models import AdminUser
+from .models import AdminUser, Hike, Member, Trail, Waiver
 
 
 @click.command("set-owner")
@@ -32,5 +32,54 @@ def set_owner_command(email: str) -> None:
     click.echo(f"Set owner: {target.email} (id={target.id}).")
 
 
+@click.command("backfill-waiver-pdfs")
+@click.option("--batch-size", default=100, show_default=True, help="Waivers rendered per commit.")
+@click.option("--processes", type=int, default=None, help="Render processes [default: WAIVER_EXPORT_PROCESSES].")
+@click.option("--all", "recheck", is_flag=True, help="Also re-render waivers whose stored file is missing.")
+@with_appcontext
+def backfill_waiver_pdfs_command(batch_size: int, processes: int, recheck: bool) -> None:
+    """Render and store the PDF of every waiver that has none in the waiver store yet.
+
+    Safe to interrupt and re-run: each batch is committed as it completes, and
+    waivers that already have a stored PDF are skipped.
+    """
+    from zoneinfo import ZoneInfo
+    from .lib.waiver_render import render_waivers, waiver_render_jobs
+    from .lib.waiver_store import record_pdf_digests, store_pdf
+
+    tz = ZoneInfo(current_app.config["SERVER_TIMEZONE"])
+    processes = processes or current_app.config["WAIVER_EXPORT_PROCESSES"]
+
+    query = (
+        db.session.query(Waiver, Member.name, Hike, Trail)
+        .join(Member, Member.id == Waiver.member_id)
+        .join(Hike, Hike.id == Waiver.hike_id)
+        .join(Trail, Trail.id == Hike.trail_id)
+        .order_by(Waiver.id.asc())
+    )
+    if not recheck:
+        query = query.filter(Waiver.pdf_sha256.is_(None))
+
+    last_id, stored = 0, 0
+    while True:
+        rows = query.filter(Waiver.id > last_id).limit(batch_size).all()
+        if not rows:
+            break
+        last_id = rows[-1][0].id
+
+        jobs = list(waiver_render_jobs(((w, hike, trail, name) for w, name, hike, trail in rows), tz, batch_size))
+        jobs = [job for job in jobs if not job.pdf_path]
+        digests = {
+            job.waiver_id: store_pdf(pdf_bytes)
+            for job, pdf_bytes in render_waivers(jobs, processes=processes if len(jobs) > processes else 1)
+        }
+        record_pdf_digests(digests)
+        stored += len(digests)
+        click.echo(f"Stored {stored} waiver PDFs (through waiver id {last_id}).")
+
+    click.echo(f"Done: {stored} waiver PDFs stored.")
+
+
 def register_commands(app) -> None:
     app.cli.add_command(set_owner_command)
+    app.cli.add_command(backfill_waiver_pdfs_command)
@@ -0,0 +1,89 @@
+"""
+Per-hike snapshot of the admin dashboard payload (/api/admin/upcoming), cached in Redis.
+
+Every SSE event makes each connected officer refetch the dashboard, so the JSON is built
+once per change rather than once per officer: snapshots are stored under a per-hike version
+number, and publishing any event that changes the payload bumps that version (see the
+`on_publish` hook below). The version doubles as the response's ETag, so a client whose
+copy is current gets a 304 without the payload being read at all.
+
+A missing version key (first use, or lost to a Redis restart or eviction) is seeded with
+the current time in milliseconds rather than 0, so a restarted counter never lands on a
+version, and so an ETag, that a dashboard may still hold.
+"""
+
+import logging
+import time
+from typing import Optional
+
+from .realtime import _get_redis, on_publish
+
+log = logging.getLogger(__name__)
+
+SNAPSHOT_TTL_SEC = 600
+
+
+def _version_key(hike_id: int) -> str:
+    return f"dashboard-snapshot-version:hike:{hike_id}"
+
+
+def _snapshot_key(hike_id: int, version: int) -> str:
+    return f"dashboard-snapshot:hike:{hike_id}:v{version}"
+
+
+@on_publish("roster_updated", "vote_updated", "checkin_updated", "waiver_updated", "phase_changed")
+def _bump_on_event(topic: str, data: dict) -> None:
+    if topic.startswith("hike:"):
+        bump_version(int(topic.split(":", 1)[1]))
+
+
+def _seed_version(r, hike_id: int) -> None:
+    r.set(_version_key(hike_id), int(time.time() * 1000), nx=True)
+
+
+def bump_version(hike_id: int) -> None:
+    """Mark every cached snapshot of this hike as stale."""
+    try:
+        r = _get_redis()
+        _seed_version(r, hike_id)
+        r.incr(_version_key(hike_id))
+    except Exception:
+        log.exception("could not bump dashboard snapshot version (hike_id=%s)", hike_id)
+
+
+def current_version(hike_id: int) -> Optional[int]:
+    """The hike's snapshot version, or None if Redis is unavailable (don't cache then)."""
+    try:
+        r = _get_redis()
+        version = r.get(_version_key(hike_id))
+        if version is None:
+            _seed_version(r, hike_id)
+            version = r.get(_version_key(hike_id))
+        return int(version)
+    except Exception:
+        log.exception("dashboard snapshot cache unavailable (hike_id=%s)", hike_id)
+        return None
+
+
+def etag(hike_id: int, version: int) -> str:
+    return f"hike-{hike_id}-v{version}"
+
+
+def load(hike_id: int, version: int) -> Optional[str]:
+    """The cached JSON body for this version, if there is one."""
+    try:
+        return _get_redis().get(_snapshot_key(hike_id, version))
+    except Exception:
+        log.exception("could not read dashboard snapshot (hike_id=%s)", hike_id)
+        return None
+
+
+def store(hike_id: int, version: int, body: str) -> None:
+    """
+    Cache a JSON body built after reading `version`. If an event bumped the version in the
+    meantime the body lands under the old number and is simply never served.
+    """
+    try:
+        _get_redis().set(_snapshot_key(hike_id, version), body, ex=SNAPSHOT_TTL_SEC)
+    except Exception:
+        log.exception("could not cache dashboard snapshot (hike_id=%s)", hike_id)
@@ -1,12 +1,105 @@
+import logging
+import queue
 import smtplib
 import ssl
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from email.message import EmailMessage
 from email.utils import formataddr
-from typing import Optional
+from typing import Mapping, Optional
 from flask import current_app
 from .email_utils import EmailFile
+from .rate_limiter import SMTPRateLimiter
+
+log = logging.getLogger(__name__)
+
+# Errors that reject one message but leave the SMTP session usable.
+_MESSAGE_ERRORS = (
+    smtplib.SMTPRecipientsRefused,
+    smtplib.SMTPSenderRefused,
+    smtplib.SMTPDataError,
+)
+
+
+def _smtp_code(exc: Exception) -> Optional[int]:
+    """SMTP reply code carried by an smtplib exception, if any."""
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return next((code for code, _ in exc.recipients.values()), None)
+    return getattr(exc, "smtp_code", None)
+
+
+def _is_disconnect(exc: OSError) -> bool:
+    """Whether a send failed because the session dropped, so a fresh session may succeed."""
+    if isinstance(exc, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(exc, smtplib.SMTPException):
+        return _smtp_code(exc) == 421  # "service not available, closing transmission channel"
+    return True  # socket-level: reset, timeout, broken pipe
+
+
+def _open_server(cfg: Mapping) -> smtplib.SMTP:
+    """Open an SMTP connection, upgrade to TLS and log in (if configured)."""
+    host = cfg.get("MAIL_SMTP_HOST")
+    if not host:
+        raise RuntimeError("MAIL_SMTP_HOST must be set")
+
+    port = int(cfg.get("MAIL_SMTP_PORT", 587))
+    username = cfg.get("MAIL_SMTP_USERNAME")
+    password = cfg.get("MAIL_SMTP_PASSWORD")
+    timeout = float(cfg.get("MAIL_SMTP_TIMEOUT", 30))
+
+    context = ssl.create_default_context()
+    server = smtplib.SMTP(host=host, port=port, timeout=timeout)
+    try:
+        server.ehlo()
+        server.starttls(context=context)
+        server.ehlo()
+        if username:  # Some relays are IP-allowed; don't force auth
+            server.login(username, password or "")
+    except Exception:
+        _close_server(server)
+        raise
+    return server
+
+
+def _close_server(server: Optional[smtplib.SMTP]) -> None:
+    if server is None:
+        return
+    try:
+        server.quit()
+    except Exception:
+        try:
+            server.close()
+        except Exception:
+            pass
+
+
+def _smtp_send(msg: EmailMessage, *, server: smtplib.SMTP, envelope_from: str) -> None:
+    """
+    Low-level SMTP sender.
+    - Sends multipart message to To/Cc/Bcc recipients over an already-open `server`.
+    """
+    # Collect recipients (To + Cc + hidden Bcc)
+    recipients: list[str] = []
+    for hdr in ("To", "Cc"):
+        if hdr in msg and msg[hdr]:
+            recipients.extend([x.strip() for x in str(msg[hdr]).split(",") if x.strip()])
+    bcc = getattr(msg, "_bcc_recipients", [])  # if you ever set it upstream
+    recipients.extend(bcc or [])
+
+    # De-dup while preserving order
+    seen = set()
+    recipients = [r for r in recipients if not (r in seen or seen.add(r))]
+    if not recipients:
+        raise ValueError("No recipients provided")
+
+    server.send_message(
+        msg,
+        from_addr=envelope_from,
+        to_addrs=list(recipients),
+    )
 
 
 class EmailConnection:
@@ -20,101 +113,192 @@ class EmailConnection:
         if cfg.get("DUMMY_EMAIL_MODE"):
             yield None
             return  # no-op in dummy mode
-        host = cfg.get("MAIL_SMTP_HOST")
-        if not host:
-            raise RuntimeError("MAIL_SMTP_HOST must be set")
-
-        port = int(cfg.get("MAIL_SMTP_PORT", 587))
-        username = cfg.get("MAIL_SMTP_USERNAME")
-        password = cfg.get("MAIL_SMTP_PASSWORD")
-        timeout = float(cfg.get("MAIL_SMTP_TIMEOUT", 30))
 
-        context = ssl.create_default_context()
-        server = smtplib.SMTP(host=host, port=port, timeout=timeout)
+        server = _open_server(cfg)
         try:
-            server.ehlo()
-            server.starttls(context=context)
-            server.ehlo()
-            if username:  # Some relays are IP-allowed; don't force auth
-                server.login(username, password or "")
             yield server
         finally:
-            try:
-                server.quit()
-            except Exception:
-                try:
-                    server.close()
-                except Exception:
-                    pass
+            _close_server(server)
+
+    def build_message(self, to, subject, text_body, html_body, files: list[EmailFile] = None) -> EmailMessage:
+        """Build a multipart/alternative message (plain text + HTML, optional attachments)."""
+        cfg = current_app.config
+        mail_from = cfg.get("MAIL_FROM")
+        if not mail_from:
+            raise RuntimeError("MAIL_FROM must be set")
 
-    def send(self, to, subject, text_body, html_body, files: list[EmailFile] = None) -> bool:
+        msg = EmailMessage()
+
+        # headers
+        msg["Subject"] = subject
+        msg["From"] = formataddr((cfg.get("MAIL_DISPLAY_FROM"), mail_from))
+        msg["To"] = to if isinstance(to, str) else ", ".join(to)
+
+        # parts
+        msg.set_content(text_body)
+        msg.add_alternative(html_body, subtype="html")
+
+        for file in files or []:
+            msg.add_attachment(file.file_bytes, maintype=file.maintype, subtype=file.subtype,
+                               filename=file.filename, disposition=file.disposition)
+
+        return msg
+
+    def send(self, to, subject, text_body, html_body, files: list[EmailFile] = None,
+             *, server: Optional[smtplib.SMTP] = None) -> bool:
         """
         Send a multipart/alternative email with plain text + HTML.
+        Reuses `server` if given, otherwise opens a one-off connection.
         Returns True/False.
         """
-        if files is None:
-            files = []
         try:
-            msg = EmailMessage()
+            msg = self.build_message(to, subject, text_body, html_body, files=files)
             cfg = current_app.config
-            mail_from = cfg.get("MAIL_FROM")
-            if not mail_from:
-                raise RuntimeError("MAIL_FROM must be set")
-
-            # headers
-            msg["Subject"] = subject
-            msg["From"] = formataddr((current_app.config.get("MAIL_DISPLAY_FROM"), mail_from))
-            msg["To"] = to if isinstance(to, str) else ", ".join(to)
-
-            # parts
-            msg.set_content(text_body)
-            msg.add_alternative(html_body, subtype="html")
-
-            if files:
-                for file in files:
-                    msg.add_attachment(file.file_bytes, maintype=file.maintype, subtype=file.subtype,
-                                       filename=file.filename, disposition=file.disposition)
 
             # Send via SMTP
             if cfg.get("DUMMY_EMAIL_MODE"):
                 time.sleep(0.1)
                 current_app.logger.info("Dummy email mode: Not sending email content:\n%s", msg)
                 return True
-            with self.connect() as server:
-                self._smtp_send(msg=msg, server=server)
+            if server is not None:
+                _smtp_send(msg, server=server, envelope_from=cfg.get("MAIL_FROM"))
+            else:
+                with self.connect() as server:
+                    _smtp_send(msg, server=server, envelope_from=cfg.get("MAIL_FROM"))
             return True
         except Exception:
             current_app.logger.exception("Email send failed (subject=%r, to=%r)", subject, to)
             return False
 
-    def _smtp_send(self, msg: EmailMessage, *, server: Optional[smtplib.SMTP] = None) -> None:
+
+class _PooledSession:
+    """One SMTP session owned by an `SMTPPool`; (re)connects lazily."""
+
+    def __init__(self, pool: "SMTPPool"):
+        self.pool = pool
+        self.server: Optional[smtplib.SMTP] = None
+        self.sent = 0
+
+    def reset(self) -> None:
+        _close_server(self.server)
+        self.server = None
+        self.sent = 0
+
+    def send(self, msg: EmailMessage) -> bool:
+        pool = self.pool
+        if pool.dummy:
+            time.sleep(0.1)
+            log.info("Dummy email mode: Not sending email content:\n%s", msg)
+            return True
+
+        # One reconnect-and-retry if the relay dropped the session under us.
+        for attempt in (1, 2):
+            if pool.auth_error is not None:
+                return False  # credentials were rejected
+            pool.limiter.acquire()
+            try:
+                if self.server is None or self.sent >= pool.max_messages:
+                    self.reset()
+                    self.server = pool.login()
+                _smtp_send(msg, server=self.server, envelope_from=pool.envelope_from)
+                self.sent += 1
+                pool.limiter.record_success()
+                return True
+            except smtplib.SMTPAuthenticationError as e:
+                self.reset()
+                log.error("SMTP relay rejected the credentials; not sending the rest (%s)", e)
+                return False
+            except _MESSAGE_ERRORS as e:
+                self._report_deferral(e)
+                log.exception("Email rejected by relay (to=%r)", msg["To"])
+                return False
+            except OSError as e:  # includes SMTPServerDisconnected and other SMTPExceptions
+                self._report_deferral(e)
+                self.reset()
+                if not _is_disconnect(e):
+                    log.exception("Email send failed (to=%r)", msg["To"])
+                    return False
+                if attempt == 2:
+                    log.exception("Email send failed after reconnect (to=%r)", msg["To"])
+                    return False
+            except Exception:
+                log.exception("Email send failed (to=%r)", msg["To"])
+                return False
+        return False
+
+    def _report_deferral(self, exc: Exception) -> None:
+        code = _smtp_code(exc)
+        if code is not None and 400 <= code < 500:
+            self.pool.limiter.record_deferral(code)
+
+
+class SMTPPool:
+    """
+    A small pool of authenticated SMTP sessions that stay open across a campaign.
+
+    `send_many` hands messages to MAIL_SMTP_POOL_SIZE worker threads, each of which
+    owns one session. Sessions are recycled after MAIL_SMTP_MAX_MESSAGES_PER_CONN
+    sends (relays commonly cap this) and reconnected if the relay drops them.
+    Every send first takes a token from the shared SMTPRateLimiter. A rejected login
+    is fatal for the whole pool: `auth_error` is set and no session tries again.
+
+    Construct inside an app context; the worker threads never touch Flask globals,
+    so messages must be built (and DB work done) by the caller.
+    """
+
+    def __init__(self, size: int = None, max_messages: int = None):
+        cfg = current_app.config
+        self.cfg = dict(cfg)
+        self.dummy = bool(cfg.get("DUMMY_EMAIL_MODE"))
+        self.envelope_from = cfg.get("MAIL_FROM")
+        self.size = max(1, int(size or cfg.get("MAIL_SMTP_POOL_SIZE", 4)))
+        self.max_messages = max(1, int(max_messages or cfg.get("MAIL_SMTP_MAX_MESSAGES_PER_CONN", 100)))
+        self.limiter = None if self.dummy else SMTPRateLimiter()
+        self.auth_error: Optional[smtplib.SMTPAuthenticationError] = None
+
+        self._sessions = [_PooledSession(self) for _ in range(self.size)]
+        self._idle: queue.LifoQueue[_PooledSession] = queue.LifoQueue()
+        for s in self._sessions:
+            self._idle.put(s)
+        self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="smtp-pool")
+        self._login_lock = threading.Lock()
+
+    def __enter__(self) -> "SMTPPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def login(self) -> smtplib.SMTP:
         """
-        Low-level SMTP sender.
-        - Reads envelope sender from config.
-        - Sends multipart message to To/Cc/Bcc recipients.
-        - If `server` is None, opens a connection via `connect()` (fallback).
+        Open a session. Logins are serialized, so rejected credentials cost a single
+        attempt; after that every caller gets the same SMTPAuthenticationError.
         """
-        cfg = current_app.config
+        with self._login_lock:
+            if self.auth_error is not None:
+                raise self.auth_error
+            try:
+                return _open_server(self.cfg)
+            except smtplib.SMTPAuthenticationError as e:
+                self.auth_error = e
+                raise
+
+    def send_many(self, messages: list[EmailMessage]) -> list[bool]:
+        """
+        Send messages in parallel; returns one success flag per message, in order.
+        Once `auth_error` is set the remaining messages fail without being sent, and
+        callers should stop handing the pool more.
+        """
+        return list(self._executor.map(self._send_one, messages))
+
+    def _send_one(self, msg: EmailMessage) -> bool:
+        session = self._idle.get()
+        try:
+            return session.send(msg)
+        finally:
+            self._idle.put(session)
 
-        # Collect recipients (To + Cc + hidden Bcc)
-        recipients: list[str] = []
-        for hdr in ("To", "Cc"):
-            if hdr in msg and msg[hdr]:
-                recipients.extend([x.strip() for x in str(msg[hdr]).split(",") if x.strip()])
-        bcc = getattr(msg, "_bcc_recipients", [])  # if you ever set it upstream
-        recipients.extend(bcc or [])
-
-        # De-dup while preserving order
-        seen = set()
-        recipients = [r for r in recipients if not (r in seen or seen.add(r))]
-        if not recipients:
-            raise ValueError("No recipients provided")
-
-        # Envelope MAIL FROM (Return-Path) — keep your current behavior
-        envelope_from = cfg.get("MAIL_FROM")
-
-        server.send_message(
-            msg,
-            from_addr=envelope_from,
-            to_addrs=list(recipients),
-        )
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        for s in self._sessions:
+            s.reset()
@@ -5,30 +5,52 @@ All officer-initiated sends (resend, late signup, transport bump) call
 `create_manual_task` before dispatching the Celery task. This creates (or
 reuses) a single "manual" EmailCampaign per hike and inserts an EmailTask
 row so the send appears in the Emails dashboard and member email history.
+
+Passengers bumped off the waitlist are recorded with `record_outbox` instead: it
+adds their rows to the hike's "waitlist_bump" campaign inside the caller's
+transaction (the transactional outbox), and one `dispatch_email_outbox` task
+drains them through the batch sender once that transaction has committed.
+
+Bulk phase campaigns get their rows from `populate_campaign_tasks`, one
+INSERT ... SELECT per audience.
 """
 
 from datetime import datetime, timezone
+from typing import Iterable
 
+from sqlalchemy import insert, literal, select
 from sqlalchemy.exc import IntegrityError
 
 from .. import db
-from ..models import EmailCampaign, EmailTask
+from ..models import EmailCampaign, EmailTask, Member, Signup
+from . import model_utils  # module import: model_utils imports this one
+
+WAITLIST_BUMP_CAMPAIGN = "waitlist_bump"
+
+# Campaign types whose rows are sent as some other email type (default: the campaign type itself)
+CAMPAIGN_EMAIL_TYPES = {WAITLIST_BUMP_CAMPAIGN: "waiver"}
+
+
+def _get_or_create_campaign(hike_id: int, campaign_type: str) -> EmailCampaign:
+    campaign = EmailCampaign.query.filter_by(hike_id=hike_id, type=campaign_type).first()
+    if campaign:
+        return campaign
+    # savepoint, so losing the race doesn't roll back the caller's transaction
+    try:
+        with db.session.begin_nested():
+            campaign = EmailCampaign(
+                hike_id=hike_id,
+                type=campaign_type,
+                date_created=datetime.now(timezone.utc),
+            )
+            db.session.add(campaign)
+    except IntegrityError:
+        campaign = EmailCampaign.query.filter_by(hike_id=hike_id, type=campaign_type).first()
+    return campaign
 
 
 def create_manual_task(hike_id: int, member_id: int, email_type: str) -> EmailTask:
-    campaign = EmailCampaign.query.filter_by(hike_id=hike_id, type="manual").first()
-    if not campaign:
-        campaign = EmailCampaign(
-            hike_id=hike_id,
-            type="manual",
-            date_created=datetime.now(timezone.utc),
-        )
-        db.session.add(campaign)
-        try:
-            db.session.flush()
-        except IntegrityError:
-            db.session.rollback()
-            campaign = EmailCampaign.query.filter_by(hike_id=hike_id, type="manual").first()
+    campaign = _get_or_create_campaign(hike_id, "manual")
 
     task = EmailTask(
         campaign_id=campaign.id,
@@ -40,3 +62,77 @@ def create_manual_task(hike_id: int, member_id: int, email_type: str) -> EmailTa
     db.session.add(task)
     db.session.commit()
     return task
+
+
+def record_outbox(hike_id: int, member_ids: Iterable[int],
+                  campaign_type: str = WAITLIST_BUMP_CAMPAIGN) -> int | None:
+    """
+    Add one pending EmailTask per member to the hike's outbox campaign, in the current
+    transaction (nothing is committed here). Rows are inserted in the given order, which
+    is the order they will be sent in. Returns the campaign id, or None if there were no members.
+    """
+    member_ids = list(member_ids)
+    if not member_ids:
+        return None
+
+    campaign = _get_or_create_campaign(hike_id, campaign_type)
+    # Lock the campaign row (finalize_email_campaign takes the same lock) until the caller
+    # commits: a concurrent finalize then either sees these rows pending, or completes
+    # first and has its date_completed cleared here.
+    campaign = (
+        db.session.query(EmailCampaign)
+        .filter_by(id=campaign.id)
+        .with_for_update()
+        .populate_existing()
+        .one()
+    )
+    campaign.date_completed = None
+    db.session.execute(
+        insert(EmailTask),
+        [{"campaign_id": campaign.id, "member_id": mid, "email_type": CAMPAIGN_EMAIL_TYPES[campaign_type],
+          "status": "pending", "attempts": 0} for mid in member_ids],
+    )
+    return campaign.id
+
+
+def campaign_audience(campaign_type: str, hike_id: int):
+    """
+    SELECT of the member ids a bulk campaign goes to: subscribed members who joined this
+    academic year for voting/signup, the hike's confirmed hikers for waiver and its
+    waitlisted hikers for waitlist. Members without an email address are left out.
+    """
+    query = select(Member.id).where(
+        Member.subscribed_to_mailing_list == True,
+        Member.email.isnot(None),
+        Member.email != "",
+    )
+    if campaign_type in ("voting", "signup"):
+        return query.where(Member.joined_on >= model_utils.get_current_ay_start())
+    if campaign_type in ("waiver", "waitlist"):
+        return (
+            query
+            .join(Signup, Signup.member_id == Member.id)
+            .where(
+                Signup.hike_id == hike_id,
+                Signup.status == ("confirmed" if campaign_type == "waiver" else "waitlisted"),
+            )
+            .distinct()
+        )
+    raise ValueError(f"No audience for campaign type '{campaign_type}'")
+
+
+def populate_campaign_tasks(campaign: EmailCampaign) -> list[int]:
+    """
+    Insert one pending EmailTask per audience member with a single server-side
+    INSERT ... SELECT and commit. Returns the recipients' member ids, taken from the
+    statement's RETURNING rather than read back with another query.
+    """
+    audience = campaign_audience(campaign.type, campaign.hike_id).subquery()
+    member_ids = db.session.scalars(
+        insert(EmailTask).from_select(
+            ["campaign_id", "member_id", "status", "attempts"],
+            select(literal(campaign.id), audience.c.id, literal("pending"), literal(0)),
+        ).returning(EmailTask.member_id)
+    ).all()
+    db.session.commit()
+    return member_ids
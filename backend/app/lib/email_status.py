@@ -0,0 +1,157 @@
+"""
+Set-based bookkeeping for campaign EmailTask rows.
+
+The batch sender claims a batch of pending rows with `claim_batch` (which charges the
+attempt and takes a lease up front, in one statement), sends it, and records each
+outcome in an `EmailStatusWriter`, which writes the whole batch back with a single
+UPDATE ... FROM (VALUES ...).
+
+Claims use SELECT ... FOR UPDATE SKIP LOCKED plus the `claimed_at` lease, so several
+senders can drain one campaign concurrently without ever holding the same row.
+
+Crash safety comes from the claim rather than per-row commits: a worker that dies
+mid-batch has already charged the attempt, and its lease expires after
+MAIL_CLAIM_LEASE_SEC, so those rows are retried at most MAIL_MAX_ATTEMPTS times in
+total. The status write only touches rows that are still 'pending', so replaying it
+is a no-op.
+
+A live sender can be slower than the lease (the shared rate limiter may drop to
+MAIL_RATE_MIN_PER_SEC across several campaigns), so `send_under_lease` sends a batch
+in chunks and re-stamps the batch's lease as it goes.
+"""
+
+import time
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+
+from sqlalchemy import Boolean, DateTime, Integer, and_, case, cast, column, or_, select, update, values
+
+from .. import db
+from ..models import EmailTask
+
+_tasks = EmailTask.__table__
+
+
+def _claimable(campaign_id: int, lease_sec: int):
+    """Pending rows of the campaign that no live sender holds."""
+    lease_cutoff = datetime.now(timezone.utc) - timedelta(seconds=lease_sec)
+    return and_(
+        _tasks.c.campaign_id == campaign_id,
+        _tasks.c.status == "pending",
+        or_(_tasks.c.claimed_at.is_(None), _tasks.c.claimed_at < lease_cutoff),
+    )
+
+
+def claim_batch(campaign_id: int, limit: int, max_attempts: int, lease_sec: int) -> list[int]:
+    """
+    Claim up to `limit` unclaimed pending tasks of a campaign (oldest first) by charging
+    one attempt each and stamping `claimed_at`, and return their ids. Rows whose lease
+    expired after every attempt was used are marked failed instead of being claimed again.
+    """
+    db.session.execute(
+        update(_tasks)
+        .where(_claimable(campaign_id, lease_sec), _tasks.c.attempts >= max_attempts)
+        .values(status="failed", claimed_at=None)
+    )
+
+    pending = (
+        select(_tasks.c.id)
+        .where(_claimable(campaign_id, lease_sec))
+        .order_by(_tasks.c.id.asc())
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    claimed = db.session.execute(
+        update(_tasks)
+        .where(_tasks.c.id.in_(pending.scalar_subquery()))
+        .values(attempts=_tasks.c.attempts + 1, claimed_at=datetime.now(timezone.utc))
+        .returning(_tasks.c.id)
+    ).scalars().all()
+    db.session.commit()
+
+    return sorted(claimed)
+
+
+class EmailStatusWriter:
+    """
+    Buffers per-task send outcomes and writes them back in one statement per flush.
+    Attempts are not touched here; they were charged by `claim_batch`. Every written
+    row has its lease released, so retryable failures can be claimed again at once.
+    """
+
+    def __init__(self, max_attempts: int):
+        self.max_attempts = max_attempts
+        self._rows: dict[int, tuple[bool, bool, datetime | None]] = {}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def sent(self, task_id: int) -> None:
+        self._rows[task_id] = (True, False, datetime.now(timezone.utc))
+
+    def failed(self, task_id: int, *, final: bool = False) -> None:
+        """Record a failed send. The row stays pending for a retry unless `final` or out of attempts."""
+        self._rows[task_id] = (False, final, None)
+
+    def flush(self) -> int:
+        """Write buffered outcomes and commit. Returns the number of rows updated."""
+        if not self._rows:
+            return 0
+
+        v = values(
+            column("id", Integer),
+            column("ok", Boolean),
+            column("final", Boolean),
+            column("sent_at", DateTime),
+            name="v",
+        ).data([(tid, ok, final, sent_at) for tid, (ok, final, sent_at) in self._rows.items()])
+
+        result = db.session.execute(
+            update(_tasks)
+            .where(_tasks.c.id == v.c.id, _tasks.c.status == "pending")
+            .values(
+                status=case(
+                    (v.c.ok, "sent"),
+                    (or_(v.c.final, _tasks.c.attempts >= self.max_attempts), "failed"),
+                    else_=_tasks.c.status,
+                ),
+                sent_at=case((v.c.ok, cast(v.c.sent_at, DateTime)), else_=_tasks.c.sent_at),
+                claimed_at=None,
+            )
+        )
+        db.session.commit()
+        self._rows.clear()
+
+        return result.rowcount
+
+
+def renew_claims(task_ids: list[int]) -> None:
+    """Restart the lease on claimed rows that are still pending, and commit."""
+    if not task_ids:
+        return
+    db.session.execute(
+        update(_tasks)
+        .where(_tasks.c.id.in_(task_ids), _tasks.c.status == "pending", _tasks.c.claimed_at.isnot(None))
+        .values(claimed_at=datetime.now(timezone.utc))
+    )
+    db.session.commit()
+
+
+def send_under_lease(pool, claimed: list[tuple[int, EmailMessage]], lease_sec: int) -> list[bool]:
+    """
+    `pool.send_many` over (task id, message) pairs, a few messages per pool session at a
+    time. Whenever a third of the lease has gone by, the lease on every row of the batch is
+    re-stamped (sent rows too: their status is only written after the batch), so no other
+    sender can claim them however slowly the batch goes. Returns one success flag per
+    message, in order.
+    """
+    chunk_size = 2 * pool.size
+    task_ids = [task_id for task_id, _ in claimed]
+    results: list[bool] = []
+    stamped = time.monotonic()
+    for start in range(0, len(claimed), chunk_size):
+        if time.monotonic() - stamped >= lease_sec / 3:
+            renew_claims(task_ids)
+            stamped = time.monotonic()
+        results.extend(pool.send_many([msg for _, msg in claimed[start:start + chunk_size]]))
+    return results
@@ -1,14 +1,22 @@
+import logging
+import os
+from collections import OrderedDict
 from datetime import timedelta
 from typing import Tuple
 from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
 from .email_utils import flatten_num
+from .realtime import _get_redis
 from ..models import Trail, Hike
 from flask import current_app
 
+log = logging.getLogger(__name__)
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates")
+
 env = Environment(
-    loader=FileSystemLoader("app/templates"),
+    loader=FileSystemLoader(TEMPLATE_DIR),
     autoescape=True,
-    bytecode_cache=FileSystemBytecodeCache(directory="app/templates/.j2cache")
+    bytecode_cache=FileSystemBytecodeCache(directory=os.path.join(TEMPLATE_DIR, ".j2cache"))
 )
 
 EMAIL_SUBJECTS = {
@@ -19,8 +27,80 @@ EMAIL_SUBJECTS = {
     "waitlist": "[Hiking Club at UCI] Waitlisted for this week's hike"
 }
 
+# Email types worth pre-rendering when a hike enters each phase
+PHASE_EMAIL_TYPES = {
+    "voting": ("voting",),
+    "signup": ("signup",),
+    "waiver": ("waiver", "waitlist", "waiver_confirmation", "late_signup"),
+}
+
+# Per-process cache of rendered batch modules, keyed on everything the batch context reads
+# from the hike plus a per-hike version in Redis that trail edits/swaps bump.
+BATCH_CACHE_SIZE = 32
+_batch_cache: "OrderedDict[tuple, Tuple]" = OrderedDict()
+
+
+def precompile_email_templates() -> int:
+    """Compile every email/*.j2 template into `env`'s cache (and the bytecode cache on disk)."""
+    names = env.list_templates(filter_func=lambda n: n.startswith("email/") and n.endswith(".j2"))
+    for name in names:
+        env.get_template(name)
+    return len(names)
+
+
+def _batch_version_key(hike_id: int) -> str:
+    return f"email-batch-version:hike:{hike_id}"
+
+
+def _batch_version(hike_id: int) -> str | None:
+    try:
+        return _get_redis().get(_batch_version_key(hike_id)) or "0"
+    except Exception:
+        log.exception("could not read email batch version (hike_id=%s); rendering uncached", hike_id)
+        return None
+
+
+def invalidate_email_batches(hike_id: int) -> None:
+    """Drop every worker's cached batch modules for this hike (call after its trail(s) change)."""
+    for key in [k for k in _batch_cache if k[1] == hike_id]:
+        _batch_cache.pop(key, None)
+    try:
+        _get_redis().incr(_batch_version_key(hike_id))
+    except Exception:
+        log.exception("could not bump email batch version (hike_id=%s)", hike_id)
+
+
+def warm_email_batches(hike: Hike) -> None:
+    """Pre-render this process's batch modules for the emails sent during the hike's current phase."""
+    for email_type in PHASE_EMAIL_TYPES.get(hike.phase, ()):
+        try:
+            render_email_batch(email_type, hike)
+        except Exception:
+            log.exception("could not warm %s email batch (hike_id=%s)", email_type, hike.id)
+
 
 def render_email_batch(email_type, hike: Hike):
+    """
+    Return the rendered batch modules for this email type and hike, from the per-process
+    cache when the hike's trail(s) haven't changed since they were built.
+    """
+    version = _batch_version(hike.id)
+    if version is None:
+        return _build_email_batch(email_type, hike)
+
+    key = (email_type, hike.id, hike.trail_id, hike.waiver_date, hike.hike_date, version)
+    rendered = _batch_cache.get(key)
+    if rendered is None:
+        rendered = _build_email_batch(email_type, hike)
+        _batch_cache[key] = rendered
+        while len(_batch_cache) > BATCH_CACHE_SIZE:
+            _batch_cache.popitem(last=False)
+    else:
+        _batch_cache.move_to_end(key)
+    return rendered
+
+
+def _build_email_batch(email_type, hike: Hike):
     """
     Compute batch context once (DB lookups, queries, markdown -> HTML, etc.) then render
     """
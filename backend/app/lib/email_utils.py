@@ -44,7 +44,13 @@ def _remove_magic_link(member_id: int, hike_id: int, email_type: str):
     return True
 
 
-def get_personalization(email_type, hike: Hike, member: Member):
+def get_personalization(email_type, hike: Hike, member: Member, magic_token: str | None = None,
+                        signup: Signup | None = None):
+    """
+    Build the per-recipient template context. Batch senders pass the campaign's pre-minted
+    `magic_token` and the member's `signup` (from one joined query per batch) to skip the
+    per-recipient lookups; without them a fresh magic link is minted here.
+    """
     personalization = {
         "name": member.name,
     }
@@ -65,17 +71,20 @@ def get_personalization(email_type, hike: Hike, member: Member):
         return personalization
 
     elif email_type == "waitlist":
-        personalization["waitlist_ordinal"] = ordinal(Signup.query.filter_by(hike_id=hike.id, member_id=member.id).first().waitlist_pos)
+        if signup is None:
+            signup = Signup.query.filter_by(hike_id=hike.id, member_id=member.id).first()
+        personalization["waitlist_ordinal"] = ordinal(signup.waitlist_pos)
         return personalization
 
     # Access-Protected Emails (Needs new magic link)
+    token = magic_token
+    if token is None:
+        # First check for existing ML. Clear it if found.
+        _remove_magic_link(member.id, hike.id, email_type)
 
-    # First check for existing ML. Clear it if found.
-    _remove_magic_link(member.id, hike.id, email_type)
-
-    # Then, generate new ML.
-    mlm = current_app.extensions.get("magic_link_manager")
-    token = mlm.generate(member_id=member.id, hike_id=hike.id, type=email_type)
+        # Then, generate new ML.
+        mlm = current_app.extensions.get("magic_link_manager")
+        token = mlm.generate(member_id=member.id, hike_id=hike.id, type=email_type)
 
     personalization["magic_url"] = f"{base_url}/{endpoint_dict[email_type]}?token={token}"
 
@@ -84,7 +93,8 @@ def get_personalization(email_type, hike: Hike, member: Member):
 
     elif email_type == "waiver":
         # Add signup transport data to waivers
-        signup = Signup.query.filter_by(hike_id=hike.id, member_id=member.id).first()
+        if signup is None:
+            signup = Signup.query.filter_by(hike_id=hike.id, member_id=member.id).first()
         personalization["transport_type"] = signup.transport_type
 
     else:
@@ -0,0 +1,84 @@
+"""
+Fairness scoring for passenger selection.
+
+Each pending passenger is reduced to an attendance bitmap over the last K past hikes of
+the academic year: bit i is set if the member signed up for hike i, where hike 0 is the
+most recent. A scoring strategy maps (bitmap, K) to a number; passengers are sorted
+once by that score (lower goes first) and by signup time within equal scores.
+
+Strategies are registered in SCORING_STRATEGIES and chosen with SELECTION_STRATEGY:
+
+  recency   Rank by how recently the member last came. Members who missed all K hikes
+            go first, and someone whose most recent trip was hike i ranks ahead of
+            someone who came to hike i - 1. With K=2 this is the original rule
+            (missed both, then missed only the last, then attended the last).
+  weighted  Sum SELECTION_WEIGHTS[i] over every attended hike i, so frequent attendees
+            sink further down the list (default weights halve with each older hike).
+"""
+
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Sequence
+
+from flask import current_app
+
+from .. import db
+from ..models import Signup
+
+# (attendance bitmap, number of hikes looked back on) -> score; lower scores are picked first
+Scorer = Callable[[int, int], float]
+
+
+def attendance_bitmaps(member_ids: List[int], hike_ids: List[int]) -> Dict[int, int]:
+    """
+    member_id -> bitmap of which of `hike_ids` (most recent first) the member signed up for,
+    built from one query. Members with no attendance are absent (treat as 0).
+    """
+    bitmaps: Dict[int, int] = defaultdict(int)
+    if not member_ids or not hike_ids:
+        return bitmaps
+    bit_for_hike = {h_id: 1 << i for i, h_id in enumerate(hike_ids)}
+    rows = (db.session.query(Signup.member_id, Signup.hike_id)
+            .filter(Signup.hike_id.in_(hike_ids))
+            .filter(Signup.member_id.in_(member_ids))
+            )
+    for member_id, hike_id in rows:
+        bitmaps[member_id] |= bit_for_hike[hike_id]
+    return bitmaps
+
+
+def recency_score(bitmap: int, k: int) -> float:
+    if not bitmap:
+        return 0
+    most_recent = (bitmap & -bitmap).bit_length() - 1  # index of the lowest set bit
+    return k - most_recent
+
+
+def weighted_scorer(weights: Optional[Sequence[float]] = None) -> Scorer:
+    # hikes older than the last given weight reuse it
+    w = list(weights) if weights else [0.5 ** i for i in range(32)]
+
+    def score(bitmap: int, k: int) -> float:
+        total = 0.0
+        i = 0
+        while bitmap and i < k:
+            if bitmap & 1:
+                total += w[i] if i < len(w) else w[-1]
+            bitmap >>= 1
+            i += 1
+        return total
+    return score
+
+
+SCORING_STRATEGIES: Dict[str, Callable[[Optional[Sequence[float]]], Scorer]] = {
+    "recency": lambda weights: recency_score,
+    "weighted": weighted_scorer,
+}
+
+
+def get_scorer(name: str = None, weights: Optional[Sequence[float]] = None) -> Scorer:
+    """The configured scoring strategy (SELECTION_STRATEGY / SELECTION_WEIGHTS unless given)."""
+    cfg = current_app.config
+    name = name or cfg.get("SELECTION_STRATEGY", "recency")
+    if name not in SCORING_STRATEGIES:
+        raise ValueError(f"Unknown selection strategy '{name}'")
+    return SCORING_STRATEGIES[name](weights if weights is not None else cfg.get("SELECTION_WEIGHTS"))
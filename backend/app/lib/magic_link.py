@@ -1,5 +1,8 @@
 import secrets
 from datetime import datetime, timezone
+from typing import Iterable
+
+from sqlalchemy import insert
 
 from ..models import MagicLink, Hike
 
@@ -29,6 +32,22 @@ class MagicLinkManager:
 
         return token
 
+    """Bulk version of generate() for campaigns: mints one token per member in a single executemany INSERT.
+    Returns a {member_id: token} map. Callers are responsible for clearing stale links first."""
+    def generate_many(self, member_ids: Iterable[int], hike_id: int, type: str) -> dict[int, str]:
+        tokens = {mid: secrets.token_urlsafe(32) for mid in dict.fromkeys(member_ids)}
+        if not tokens:
+            return {}
+
+        self.db.session.execute(
+            insert(MagicLink),
+            [{"token": token, "member_id": mid, "hike_id": hike_id, "type": type}
+             for mid, token in tokens.items()],
+        )
+        self.db.session.commit()
+
+        return tokens
+
     def validate(self, token):
         magic_link = MagicLink.query.filter_by(token=token).first()
 
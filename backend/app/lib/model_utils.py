@@ -1,9 +1,10 @@
 from datetime import datetime, timezone
 
 from flask import current_app
-from .selection_algorithm import calc_passenger_capacity
+from sqlalchemy import and_, case, func, select, update
 from .. import db
-from ..models import Hike, Signup
+from ..models import Hike, Member, Signup, Trail, Vehicle, Vote
+from .email_record import record_outbox
 
 
 def get_current_ay_start() -> datetime:
@@ -23,46 +24,74 @@ def current_active_hike() -> Hike | None:
         .first()
     )
 
+
+def candidate_votes(hike_id: int) -> list[tuple[Trail, list[str]]]:
+    """Every active vote candidate with the names of the members who voted for it, in one query."""
+    rows = (
+        db.session.query(Trail, func.array_agg(Member.name).filter(Member.id.isnot(None)))
+        .outerjoin(Vote, and_(Vote.trail_id == Trail.id, Vote.hike_id == hike_id))
+        .outerjoin(Member, Member.id == Vote.member_id)
+        .filter(Trail.is_active_vote_candidate == True)
+        .group_by(Trail.id)
+        .order_by(Trail.id)
+        .all()
+    )
+    return [(trail, names or []) for trail, names in rows]  # NULL when a trail has no votes
+
+
+def lock_hike(hike_id: int) -> Hike | None:
+    """
+    Load the hike with SELECT ... FOR UPDATE. Waitlist changes take this lock first, so concurrent
+    late signups / cancellations / the waiver cutover rewrite a hike's waitlist one at a time.
+    Held until the caller's next commit or rollback.
+    """
+    return Hike.query.filter_by(id=hike_id).with_for_update().populate_existing().first()
+
+
 def update_waitlist(hike_id: int):
     """
     Calculates the number of passengers to bump off the waitlist based on current driver capacity,
     Bumps that number of passengers off the waitlist and update all waitlist positions.
     If no passengers need to be bumped, just updates waitlist positions.
+
+    Runs as one UPDATE (row_number() over the current waitlist order) under the hike's row lock.
+    Waiver emails for the bumped passengers are queued as outbox rows in the same transaction,
+    and a single dispatch_email_outbox task sends them in waitlist order after the commit.
     """
-    hike = Hike.query.get(hike_id)
+    hike = lock_hike(hike_id)
 
     # check if CONFIRMED signups are over capacity (only happens when drivers cancel or passengers are manually confirmed)
-    capacity = calc_passenger_capacity(Signup.query.filter_by(hike_id=hike.id, transport_type="driver").all())
+    capacity = (db.session.query(func.coalesce(func.sum(Vehicle.passenger_seats), 0))
+                .select_from(Signup)
+                .join(Vehicle, Vehicle.id == Signup.vehicle_id)
+                .filter(Signup.hike_id == hike.id, Signup.transport_type == "driver")
+                .scalar())
     num_confirmed_pasengers = Signup.query.filter_by(hike_id=hike.id, transport_type="passenger", status="confirmed").count()
-    print(capacity, num_confirmed_pasengers)
-    if num_confirmed_pasengers >= capacity:
-        num_passengers_to_bump = 0
-
-    num_passengers_to_bump = capacity - num_confirmed_pasengers
-
-    waitlist = list(Signup.query
-                    .with_entities(Signup.id)
-                    .filter_by(hike_id=hike.id, status="waitlisted")
-                    .order_by(Signup.waitlist_pos.asc())
-                    )
-
-    # bump waitlisted members
-    while num_passengers_to_bump > 0 and len(waitlist) > 0:
-        s = Signup.query.get(waitlist.pop(0))
-        s.status = "confirmed"
-        s.waitlist_pos = None
-        current_app.extensions["celery"].send_task("app.tasks.send_email", args=["waiver", s.member_id, hike.id])
-        num_passengers_to_bump -= 1
-
-    db.session.commit()
+    num_passengers_to_bump = max(0, capacity - num_confirmed_pasengers)
 
-    # update remaining waitlist positions
-    remaining = (Signup.query
-                 .filter_by(hike_id=hike.id, status="waitlisted")
-                 .order_by(Signup.waitlist_pos.asc())
-                 .all())
+    signups = Signup.__table__
+    waitlist_order = (signups.c.waitlist_pos.asc(), signups.c.id.asc())
+    bumped_ids = []
+    if num_passengers_to_bump:
+        bumped_ids = db.session.execute(
+            select(signups.c.member_id)
+            .where(signups.c.hike_id == hike.id, signups.c.status == "waitlisted")
+            .order_by(*waitlist_order)
+            .limit(num_passengers_to_bump)
+        ).scalars().all()
 
-    for idx, signup in enumerate(remaining, start=1):
-        signup.waitlist_pos = idx
+    ranked = (select(signups.c.id, func.row_number().over(order_by=waitlist_order).label("rn"))
+              .where(signups.c.hike_id == hike.id, signups.c.status == "waitlisted")
+              .subquery())
+    bumped = ranked.c.rn <= num_passengers_to_bump
+    db.session.execute(
+        update(signups)
+        .where(signups.c.id == ranked.c.id)
+        .values(status=case((bumped, "confirmed"), else_="waitlisted"),
+                waitlist_pos=case((bumped, None), else_=ranked.c.rn - num_passengers_to_bump))
+    )
+    outbox_campaign_id = record_outbox(hike.id, bumped_ids)
+    db.session.commit()
 
-    db.session.commit()
\ No newline at end of file
+    if outbox_campaign_id:
+        current_app.extensions["celery"].send_task("app.tasks.dispatch_email_outbox", kwargs={"hike_id": hike.id})
@@ -1,14 +1,89 @@
 import base64
 import io
+import os
+import threading
+from typing import NamedTuple
+
 import pymupdf
 from PIL import Image
 
+WAIVER_TEMPLATE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates", "waiver_fillable.pdf"
+)
+
+
+
+class WidgetIndex(NamedTuple):
+    """Where a form field lives in the waiver template: page number, rect, widget annot xref."""
+    page: int
+    rect: pymupdf.Rect
+    xref: int
+
+
+# Loaded once per process (see the worker_process_init hook in tasks.py).
+_template_lock = threading.Lock()
+_waiver_template_bytes: bytes | None = None
+_waiver_widget_index: dict[str, WidgetIndex] | None = None
+
+
+def load_waiver_template() -> bytes:
+    """Raw bytes of the fillable waiver PDF, read from disk on first use only."""
+    global _waiver_template_bytes
+    if _waiver_template_bytes is None:
+        with _template_lock:
+            if _waiver_template_bytes is None:
+                with open(WAIVER_TEMPLATE_PATH, "rb") as f:
+                    _waiver_template_bytes = f.read()
+    return _waiver_template_bytes
+
+
+def open_waiver_template() -> pymupdf.Document:
+    """A fresh, writable document opened from the in-memory template bytes."""
+    return pymupdf.open(stream=load_waiver_template(), filetype="pdf")
+
+
+def build_widget_index(doc) -> dict[str, WidgetIndex]:
+    """Scan every widget of `doc` once: field name -> (page, rect, xref)."""
+    index = {}
+    for page in doc:
+        for w in page.widgets() or []:
+            # w.field_name is None for some widgets; guard it
+            name = (w.field_name or "").strip()
+            if name and name not in index:
+                index[name] = WidgetIndex(page.number, pymupdf.Rect(w.rect), w.xref)
+    return index
+
+
+def waiver_widget_index() -> dict[str, WidgetIndex]:
+    """
+    Widget layout of the waiver template, parsed once per process. Every document
+    opened with `open_waiver_template` shares these page numbers and xrefs.
+    """
+    global _waiver_widget_index
+    if _waiver_widget_index is None:
+        with open_waiver_template() as doc:
+            _waiver_widget_index = build_widget_index(doc)
+    return _waiver_widget_index
+
+
+def _lookup(index: dict[str, WidgetIndex], field_name: str) -> WidgetIndex:
+    try:
+        return index[field_name]
+    except KeyError:
+        raise ValueError(f"Form field named '{field_name}' not found in PDF.") from None
+
 
-def _decode_base64_image(b64: str) -> bytes:
-    # Accept both raw base64 and data URLs like "data:image/png;base64,..."
-    if "," in b64 and b64.strip().lower().startswith("data:"):
-        b64 = b64.split(",", 1)[1]
-    return base64.b64decode(b64)
+def decode_image_data_url(b64: str, default_mimetype: str = "image/png") -> tuple[str, bytes]:
+    """
+    Decode a base64 image into (mimetype, bytes). Accepts both raw base64 and data URLs
+    like "data:image/png;base64,...". Raises ValueError if it isn't valid base64.
+    """
+    mimetype = default_mimetype
+    b64 = b64.strip()
+    if "," in b64 and b64.lower().startswith("data:"):
+        header, b64 = b64.split(",", 1)
+        mimetype = header[5:].split(";", 1)[0] or default_mimetype
+    return mimetype, base64.b64decode(b64, validate=True)
 
 
 def _fit_rect_keep_aspect(target_rect: pymupdf.Rect, img_w: int, img_h: int) -> pymupdf.Rect:
@@ -37,73 +112,42 @@ def _fit_rect_keep_aspect(target_rect: pymupdf.Rect, img_w: int, img_h: int) ->
 
 def fill_signature(
         doc,
+        index: dict[str, WidgetIndex],
         field_name: str,
-        b64_image: str,
+        img_bytes: bytes,
         remove_field: bool = True
 ):
     """
-    Draw a base64 signature image over the rectangle of a PDF signature (or any) form field.
+    Draw a signature image over the rectangle of a PDF signature (or any) form field.
     If remove_field=True, the form field is deleted, effectively flattening the signature.
+    `index` comes from `build_widget_index` (or `waiver_widget_index`) for this document.
     """
+    field = _lookup(index, field_name)
+    page = doc[field.page]
 
-    # Decode image + get dimensions
-    img_bytes = _decode_base64_image(b64_image)
     # Use PIL to query image size for aspect-correct scaling
     with Image.open(io.BytesIO(img_bytes)) as im:
         img_w, img_h = im.size
 
-    # Find the matching widget by field name
-    target_widget = None
-    for page in doc:
-        for w in page.widgets() or []:
-            # w.field_name is None for some widgets; guard it
-            if (w.field_name or "").strip() == field_name:
-                target_widget = (page, w)
-                break
-        if target_widget:
-            break
-
-    if not target_widget:
-        raise ValueError(f"Form field named '{field_name}' not found in PDF.")
-
-    page, widget = target_widget
-    rect = pymupdf.Rect(widget.rect)  # widget rectangle in PDF user space
-
     # Compute fitted rectangle (keeps image aspect ratio; centered)
-    draw_rect = _fit_rect_keep_aspect(rect, img_w, img_h)
+    draw_rect = _fit_rect_keep_aspect(field.rect, img_w, img_h)
 
     # Draw the image over the widget rect
     page.insert_image(draw_rect, stream=img_bytes, keep_proportion=False)
 
     # Optionally remove the field so it's flattened (no longer editable)
     if remove_field:
-        # Remove the annotation for this widget = removes the field appearance.
-        # If it's the only widget of that field, this effectively removes the field.
-        try:
-            page.delete_annot(widget.annot)
-        except Exception:
-            # Fallback: if delete_annot fails, at least set the field read-only
-            try:
-                widget.set_readonly(True)
-                widget.update()
-            except Exception:
-                pass
-
-
-def fill_text_rich(page, field_name: str, html_body: str, pad: float = 1.5, font_size=9):
-    # find the widget by field name
-    w = next((w for w in (page.widgets() or []) if w.field_name == field_name), None)
-    if not w:
-        raise ValueError(f"Widget '{field_name}' not found on page.")
-
-    # clear widget value & hide its visuals so our drawn text isn't overlapped
-    w.field_value = ""
-    w.border_color = None
-    w.fill_color = None
-    w.update()
+        _remove_widget(page, field)
+
+
+def fill_text_rich(doc, index: dict[str, WidgetIndex], field_name: str, html_body: str,
+                   pad: float = 1.5, font_size=9):
+    """Draw styled HTML text inside a form field's rect and remove the field itself."""
+    field = _lookup(index, field_name)
+    page = doc[field.page]
 
     # draw styled text inside the widget rect
-    r = w.rect
+    r = field.rect
     draw_rect = pymupdf.Rect(r.x0 + pad, r.y0 + pad, r.x1 - pad, r.y1 - pad)
     html = f"""
         <div style="
@@ -117,8 +161,18 @@ def fill_text_rich(page, field_name: str, html_body: str, pad: float = 1.5, font
         """
     page.insert_htmlbox(draw_rect, html)
 
-    # flatten/remove the widget annotation itself
-    for a in (page.annots() or []):
-        if a.type[0] == pymupdf.PDF_ANNOT_WIDGET and getattr(a, "field_name", None) == field_name:
-            a.flatten()
-            break
+    # remove the widget so its (empty) appearance can't overlap our drawn text
+    _remove_widget(page, field)
+
+
+def _remove_widget(page, field: WidgetIndex) -> None:
+    """Delete one widget by xref; if that fails, at least make the field read-only."""
+    try:
+        page.delete_widget(page.load_widget(field.xref))
+    except Exception:
+        try:
+            widget = page.load_widget(field.xref)
+            widget.field_flags |= pymupdf.PDF_FIELD_IS_READ_ONLY
+            widget.update()
+        except Exception:
+            pass
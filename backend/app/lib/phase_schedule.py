@@ -0,0 +1,144 @@
+"""
+Phase transitions of the active hike, run by Celery ETA tasks at the dates set on the hike.
+
+Each phase ends at one of the hike's dates: voting at `signup_date`, signup at `waiver_date`
+and waiver HIKE_RESET_TIME_HR after `hike_date`. `schedule_phase_transition` queues an
+`advance_hike_phase` task for that moment; when it runs it moves the hike to the next phase,
+hands that phase's email campaigns to their own tasks and schedules the following transition.
+
+A phase can last days, but the Redis broker redelivers ETA messages that have been held
+longer than its visibility timeout (1h), so no message is scheduled more than
+MAX_ETA_SEC ahead: a task that wakes up before the due date re-queues itself for the rest.
+Every schedule carries a token that is also stored in Redis; rescheduling (a new hike, or
+dates that moved) replaces the token, and tasks holding an older one stop there.
+
+The transition itself runs under a Redis lock and re-checks the hike's phase inside it, so
+duplicate or redelivered tasks cannot fire the same transition twice.
+`check_and_update_phase` stays on beat, less often, as a safety net for lost messages.
+"""
+
+import logging
+import secrets
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from redis.exceptions import LockError
+
+from .. import db
+from ..models import Hike
+from . import phases
+from .realtime import _get_redis
+
+log = logging.getLogger(__name__)
+
+# Keep ETAs well inside the broker's visibility timeout.
+MAX_ETA_SEC = 30 * 60
+# Upper bound on how long one transition (vote count, passenger selection) may hold the lock.
+LOCK_TIMEOUT_SEC = 5 * 60
+
+
+def _schedule_key(hike_id: int) -> str:
+    return f"phase-schedule:hike:{hike_id}"
+
+
+def _lock_key(hike_id: int) -> str:
+    return f"phase-transition:hike:{hike_id}"
+
+
+def _utc(dt: datetime) -> datetime:
+    # hike dates are stored as naive UTC
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+
+def phase_due_at(hike: Hike) -> datetime | None:
+    """When the hike's current phase should end (aware UTC), or None if it has no scheduled end."""
+    if hike.status != "active":
+        return None
+    match hike.phase:
+        case "voting":
+            return _utc(hike.signup_date)
+        case "signup":
+            return _utc(hike.waiver_date)
+        case "waiver":
+            return _utc(hike.hike_date) + timedelta(hours=current_app.config.get("HIKE_RESET_TIME_HR"))
+    return None
+
+
+def _send(hike_id: int, phase: str, token: str | None, due: datetime) -> None:
+    eta = min(due, datetime.now(timezone.utc) + timedelta(seconds=MAX_ETA_SEC))
+    current_app.extensions["celery"].send_task(
+        "app.tasks.advance_hike_phase",
+        kwargs={"hike_id": hike_id, "phase": phase, "token": token},
+        eta=eta,
+    )
+
+
+def schedule_phase_transition(hike: Hike) -> datetime | None:
+    """
+    (Re)schedule the end of the hike's current phase, superseding anything scheduled before.
+    Call after committing a new hike or new dates. Returns the due time, or None if nothing
+    was scheduled.
+    """
+    r = _get_redis()
+    due = phase_due_at(hike)
+    if due is None:
+        r.delete(_schedule_key(hike.id))
+        return None
+
+    token = secrets.token_hex(8)
+    r.set(_schedule_key(hike.id), token)
+    _send(hike.id, hike.phase, token, due)
+    return due
+
+
+def is_scheduled(hike_id: int) -> bool:
+    return bool(_get_redis().exists(_schedule_key(hike_id)))
+
+
+def advance_phase(hike_id: int, phase: str, token: str | None = None) -> bool:
+    """
+    Run the transition out of `phase` if the hike is still in it and it is due. A `token`
+    from an outdated schedule makes this a no-op; None (the beat safety net) skips that check.
+    Returns whether the hike was advanced.
+    """
+    r = _get_redis()
+    if token is not None and r.get(_schedule_key(hike_id)) != token:
+        return False
+
+    lock = r.lock(_lock_key(hike_id), timeout=LOCK_TIMEOUT_SEC, blocking_timeout=0)
+    if not lock.acquire():
+        log.info("phase transition for hike %s is already running", hike_id)
+        return False
+
+    try:
+        hike = db.session.get(Hike, hike_id, populate_existing=True)
+        if not hike or hike.status != "active" or hike.phase != phase:
+            return False
+
+        due = phase_due_at(hike)
+        if due is None:
+            return False
+        if datetime.now(timezone.utc) < due:
+            if token is not None:
+                _send(hike_id, phase, token, due)
+            return False
+
+        celery = current_app.extensions["celery"]
+        match phase:
+            case "voting":
+                phases.initiate_signup_phase(hike_id)
+                celery.send_task("app.tasks.start_email_campaign", args=[hike_id])
+            case "signup":
+                phases.initiate_waiver_phase(hike_id)
+                celery.send_task("app.tasks.start_email_campaign", args=[hike_id])
+                celery.send_task("app.tasks.start_email_campaign", args=[hike_id], kwargs={"waitlist": True})
+            case "waiver":
+                phases.complete_hike(hike_id)
+
+        schedule_phase_transition(db.session.get(Hike, hike_id))
+        return True
+    finally:
+        try:
+            lock.release()
+        except LockError:
+            log.warning("phase transition lock for hike %s expired before the transition finished", hike_id)
@@ -1,10 +1,13 @@
 """ Scripts that run at the turn of a phase """
 
 import random
+from sqlalchemy import Integer, String, cast, column, update, values
 from ..models import Hike, Trail, Vote, Signup, MagicLink
 from .. import db
 from . import selection_algorithm
+from .model_utils import lock_hike
 from .realtime import publish_event
+from .email_templates import warm_email_batches
 
 
 def initiate_signup_phase(hike_id: int):
@@ -29,10 +32,12 @@ def initiate_signup_phase(hike_id: int):
     ah.email_campaign_completed = False
     db.session.commit()
     publish_event(f"hike:{ah.id}", "phase_changed", {"phase": "signup"})
+    warm_email_batches(ah)
 
 
 def initiate_waiver_phase(hike_id: int):
-    ah = Hike.query.get(hike_id)
+    # lock the hike so late signups can't touch the roster while it is being split
+    ah = lock_hike(hike_id)
     if not ah: raise Exception("Invalid hike ID")
     if ah.phase != "signup":
         raise Exception(f"Hike {ah.id} has improper phase of {ah.phase}, cannot start waiver phase")
@@ -43,15 +48,25 @@ def initiate_waiver_phase(hike_id: int):
     # update signups
     print(f"confirmed signup IDs: {confirmed}")
     print(f"waitlisted signup IDs: {waitlisted}")
-    Signup.query.filter(Signup.id.in_(confirmed)).update({Signup.status: "confirmed"}, synchronize_session='auto')
-
-    for pos, sid in enumerate(waitlisted, 1):
-        s = Signup.query.get(sid)
-        s.status = "waitlisted"
-        s.waitlist_pos = pos
+    rows = ([(sid, "confirmed", None) for sid in confirmed]
+            + [(sid, "waitlisted", pos) for pos, sid in enumerate(waitlisted, 1)])
+    if rows:
+        signups = Signup.__table__
+        v = values(
+            column("id", Integer),
+            column("status", String),
+            column("waitlist_pos", Integer),
+            name="v",
+        ).data(rows)
+        db.session.execute(
+            update(signups)
+            .where(signups.c.id == v.c.id)
+            .values(status=v.c.status, waitlist_pos=cast(v.c.waitlist_pos, Integer))  # all-NULL VALUES would be text
+        )
 
     db.session.commit()
     publish_event(f"hike:{ah.id}", "phase_changed", {"phase": "waiver"})
+    warm_email_batches(ah)
 
 
 def complete_hike(hike_id: int):
@@ -0,0 +1,138 @@
+"""
+Adaptive token-bucket rate limiter for outgoing SMTP, shared by every worker through Redis.
+
+All senders draw tokens from one bucket, so the relay sees a single combined rate no
+matter how many campaign shards are running. The refill rate adapts AIMD-style: each
+delivered message nudges it up by a small step towards MAIL_RATE_MAX_PER_SEC, and a
+transient 4xx reply from the relay (421 "try again later", 451 "local error" ...)
+halves it, down to MAIL_RATE_MIN_PER_SEC.
+
+The current rate and the last deferral are kept in the same Redis hash, so
+`current_send_rate()` can show officers why a campaign is slow.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from typing import Optional
+
+from flask import current_app
+
+from .realtime import _get_redis
+
+log = logging.getLogger(__name__)
+
+BUCKET_KEY = "mail:rate_limiter"
+BUCKET_TTL_SEC = 24 * 3600
+
+# Fraction of the max rate added per delivered message, and the multiplier applied on a deferral.
+RAMP_STEP_FRACTION = 0.02
+BACKOFF_FACTOR = 0.5
+# Parallel sends tend to be deferred together; only back off once per window.
+BACKOFF_WINDOW_SEC = 1.0
+
+# Redis TIME is used throughout so every worker agrees on the clock.
+_ACQUIRE_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1e6
+local rate = tonumber(redis.call('HGET', KEYS[1], 'rate') or ARGV[1])
+local burst = tonumber(ARGV[2])
+local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens') or burst)
+local ts = tonumber(redis.call('HGET', KEYS[1], 'ts') or now)
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+else
+  wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now), 'rate', tostring(rate))
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return tostring(wait)
+"""
+
+_RAMP_UP_LUA = """
+local rate = tonumber(redis.call('HGET', KEYS[1], 'rate') or ARGV[2])
+rate = math.min(tonumber(ARGV[2]), rate + tonumber(ARGV[1]))
+redis.call('HSET', KEYS[1], 'rate', tostring(rate))
+return tostring(rate)
+"""
+
+_BACK_OFF_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1e6
+local rate = tonumber(redis.call('HGET', KEYS[1], 'rate') or ARGV[3])
+local last = tonumber(redis.call('HGET', KEYS[1], 'backoff_at') or 0)
+if now - last >= tonumber(ARGV[5]) then
+  rate = math.max(tonumber(ARGV[2]), rate * tonumber(ARGV[1]))
+  redis.call('HSET', KEYS[1], 'rate', tostring(rate), 'backoff_at', tostring(now), 'backoff_code', ARGV[4])
+end
+return tostring(rate)
+"""
+
+
+class SMTPRateLimiter:
+    """
+    Construct inside an app context; afterwards it is safe to use from SMTPPool threads.
+    If Redis is unreachable, sending falls back to a local pace of MAIL_RATE_MIN_PER_SEC.
+    """
+
+    def __init__(self):
+        cfg = current_app.config
+        self.max_rate = float(cfg.get("MAIL_RATE_MAX_PER_SEC", 10))
+        self.min_rate = min(float(cfg.get("MAIL_RATE_MIN_PER_SEC", 0.5)), self.max_rate)
+        self.burst = max(1, int(cfg.get("MAIL_RATE_BURST", 10)))
+        self._redis = _get_redis()
+        self._acquire = self._redis.register_script(_ACQUIRE_LUA)
+        self._ramp_up = self._redis.register_script(_RAMP_UP_LUA)
+        self._back_off = self._redis.register_script(_BACK_OFF_LUA)
+
+    def acquire(self) -> None:
+        """Block until the shared bucket grants one message."""
+        while True:
+            try:
+                wait = float(self._acquire(keys=[BUCKET_KEY], args=[self.max_rate, self.burst, BUCKET_TTL_SEC]))
+            except Exception:
+                log.exception("SMTP rate limiter unavailable; pacing locally")
+                time.sleep(1.0 / self.min_rate)
+                return
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def record_success(self) -> None:
+        try:
+            self._ramp_up(keys=[BUCKET_KEY], args=[self.max_rate * RAMP_STEP_FRACTION, self.max_rate])
+        except Exception:
+            log.exception("SMTP rate limiter ramp-up failed")
+
+    def record_deferral(self, code: int) -> None:
+        """The relay answered with a transient (4xx) code: slow every sender down."""
+        try:
+            rate = float(self._back_off(
+                keys=[BUCKET_KEY],
+                args=[BACKOFF_FACTOR, self.min_rate, self.max_rate, code, BACKOFF_WINDOW_SEC],
+            ))
+            log.warning("SMTP relay deferred with %s; send rate now %.2f/s", code, rate)
+        except Exception:
+            log.exception("SMTP rate limiter back-off failed")
+
+
+def current_send_rate() -> Optional[dict]:
+    """Current shared send rate and last deferral, or None if nothing has been sent recently."""
+    try:
+        state = _get_redis().hgetall(BUCKET_KEY)
+    except Exception:
+        log.exception("could not read SMTP rate limiter state")
+        return None
+    if not state:
+        return None
+
+    backoff_at = state.get("backoff_at")
+    return {
+        "rate_per_sec": round(float(state.get("rate", 0)), 2),
+        "max_rate_per_sec": float(current_app.config.get("MAIL_RATE_MAX_PER_SEC", 10)),
+        "last_deferral_code": int(state["backoff_code"]) if state.get("backoff_code") else None,
+        "last_deferral_ago_sec": int(time.time() - float(backoff_at)) if backoff_at else None,
+    }
@@ -4,13 +4,33 @@ dashboards.
 
 Producers (route handlers, Celery tasks) call `publish_event(topic, event, data)`
 after committing a state change. The SSE endpoint in `routes/stream.py` opens
-a long-lived greenlet (gevent worker) per client that subscribes to the
-client's requested topics and yields SSE-formatted lines as messages arrive.
+a long-lived greenlet (gevent worker) per client that yields SSE-formatted
+lines as messages for the client's requested topics arrive.
+
+Every event is also appended to a capped Redis Stream per topic, and its
+entry id is sent as the SSE `id:` (one position per topic the connection
+streams). A client reconnecting with `Last-Event-ID` is first replayed what it
+missed from those streams, then continues live; if its position has already
+been trimmed away it is sent a `resync` event and refetches instead.
+
+Each worker process holds a single Redis pubsub connection, pattern-subscribed
+to every streamable topic prefix, and one reader greenlet that hands each
+message to the queues of the clients that asked for its topic. Client
+greenlets block on their queue, so an idle dashboard costs no CPU and no Redis
+connection of its own.
 
 Payloads are intentionally small — IDs only. Clients refetch existing REST
 endpoints to reconcile state. This keeps the producer and the REST schema
 on a single source of truth and makes missed events / reconnects naturally
 idempotent.
+
+Delta mode (opt-in): a publisher may also attach a `patch`, a compact change to
+the REST payload the topic's clients hold, so they can apply it instead of
+refetching. Patches mirror that payload's shape: lists of partial rows merged by
+key, e.g. {"users": [{"member_id": 3, "is_checked_in": true}]} for the
+/upcoming roster or {"trails": [{"trail_id": 1, "trail_num_votes": 4, ...}]}
+for vote counts. Every event also carries a per-topic `seq` (1, 2, 3, ...);
+a client that sees a gap knows it missed something and falls back to a refetch.
 """
 
 from __future__ import annotations
@@ -18,9 +38,11 @@ from __future__ import annotations
 import json
 import logging
 import os
+import queue
 import threading
 import time
-from typing import Any, Iterable, Iterator, Optional
+from collections import defaultdict
+from typing import Any, Callable, Iterable, Iterator, Optional
 
 import redis
 from flask import current_app
@@ -31,9 +53,23 @@ log = logging.getLogger(__name__)
 # nginx idle-close window and any browser/proxy buffering thresholds.
 KEEPALIVE_SEC = 25
 
-# Per-message poll cadence inside the stream loop. Short enough that a
-# disconnect is detected promptly when we try to write the next chunk.
-POLL_SEC = 1.0
+# Topics clients may stream; the shared subscriber listens on `<prefix>*` for each.
+TOPIC_PREFIXES = ("hike:", "email-campaigns:hike:", "campaign:")
+
+# Messages buffered per client. A client that falls this far behind loses
+# messages, which it notices as a `seq` gap and recovers from by refetching.
+CLIENT_QUEUE_SIZE = 1000
+
+# Pause before the shared subscriber reconnects after losing Redis.
+RECONNECT_SEC = 1.0
+
+# How long a new client waits for the shared subscriber to be (re)subscribed.
+SUBSCRIBE_WAIT_SEC = 5.0
+
+# Replay window: entries kept per topic stream (approximately; trimmed with
+# MAXLEN ~) and how long an idle topic's stream lives.
+STREAM_MAXLEN = 1000
+STREAM_TTL_SEC = 24 * 3600
 
 
 _redis_lock = threading.Lock()
@@ -67,73 +103,337 @@ def _broker_url() -> str:
     return os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
 
 
-def publish_event(topic: str, event: str, data: Optional[dict] = None) -> None:
+# Assign the topic's next sequence number, append the event to the topic's
+# stream and publish it, all in one step, so sequence order, stream order and
+# publish order agree even with many producers. ARGV[2] is a JSON object;
+# "seq" is spliced in as its first key. The published message is
+# "<stream entry id> <json>". Both keys share the stream's idle TTL; a topic
+# that comes back after it expired restarts at seq 1, which clients treat as a
+# gap and refetch.
+_PUBLISH_LUA = """
+local seq = redis.call('INCR', KEYS[1])
+local msg = '{"seq": ' .. seq .. ', ' .. string.sub(ARGV[2], 2)
+local id = redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[3], '*', 'msg', msg)
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+redis.call('PUBLISH', ARGV[1], id .. ' ' .. msg)
+return seq
+"""
+_publish_script = None
+
+
+def _seq_key(topic: str) -> str:
+    return f"realtime:seq:{topic}"
+
+
+def _stream_key(topic: str) -> str:
+    return f"realtime:stream:{topic}"
+
+
+# event name -> in-process callbacks run by publish_event, e.g. to drop caches
+# that depend on the state the event announces.
+_publish_hooks: dict[str, list[Callable[[str, dict], None]]] = defaultdict(list)
+
+
+def on_publish(*events: str):
+    """Decorator: call `fn(topic, data)` whenever this process publishes one of `events`."""
+    def register(fn):
+        for event in events:
+            _publish_hooks[event].append(fn)
+        return fn
+    return register
+
+
+def publish_event(topic: str, event: str, data: Optional[dict] = None, patch: Optional[dict] = None) -> None:
     """
     Best-effort publish to a Redis channel. Never raises into the caller —
     realtime is an enhancement, not a correctness requirement, so a Redis
-    blip must not break a write path.
+    blip must not break a write path. `patch` opts the event into delta mode
+    (see module docstring).
     """
-    payload = json.dumps({"event": event, "data": data or {}})
+    global _publish_script
+    for hook in _publish_hooks.get(event, ()):
+        try:
+            hook(topic, data or {})
+        except Exception:
+            log.exception("publish hook %r failed (topic=%r, event=%r)", hook, topic, event)
+
+    message = {"event": event, "data": data or {}}
+    if patch is not None:
+        message["patch"] = patch
     try:
-        _get_redis().publish(topic, payload)
+        r = _get_redis()
+        if _publish_script is None:
+            _publish_script = r.register_script(_PUBLISH_LUA)
+        _publish_script(
+            keys=[_seq_key(topic), _stream_key(topic)],
+            args=[topic, json.dumps(message), STREAM_MAXLEN, STREAM_TTL_SEC],
+        )
     except Exception:
         log.exception("publish_event failed (topic=%r, event=%r)", topic, event)
 
 
-def stream(topics: Iterable[str]) -> Iterator[bytes]:
+class ThrottledPublisher:
+    """
+    Coalesces bursts from a long-running producer (e.g. the batch email sender):
+    each (topic, event) pair is published at most once per `min_interval_sec`, with
+    the latest data winning. Call `flush()` before finishing to emit anything that
+    was held back. Clients refetch on every event, so dropping intermediate
+    duplicates loses nothing.
+    """
+
+    def __init__(self, min_interval_sec: float):
+        self.min_interval_sec = min_interval_sec
+        self._last_sent: dict[tuple[str, str], float] = {}
+        self._held: dict[tuple[str, str], Optional[dict]] = {}
+
+    def publish(self, topic: str, event: str, data: Optional[dict] = None) -> None:
+        key = (topic, event)
+        now = time.monotonic()
+        if now - self._last_sent.get(key, float("-inf")) >= self.min_interval_sec:
+            self._held.pop(key, None)
+            self._last_sent[key] = now
+            publish_event(topic, event, data)
+        else:
+            self._held[key] = data
+
+    def flush(self) -> None:
+        held, self._held = self._held, {}
+        for (topic, event), data in held.items():
+            self._last_sent[(topic, event)] = time.monotonic()
+            publish_event(topic, event, data)
+
+
+class _Fanout:
+    """
+    The worker's one pattern-subscribed pubsub connection, plus the reader
+    that dispatches its messages to per-client queues. Started on first use.
+    Under gunicorn's gevent worker the threading/queue primitives are
+    monkey-patched, so the reader is a greenlet and the queues are gevent queues.
+
+    Pub/sub drops whatever is published while the connection is down or not yet
+    subscribed, so the fanout remembers the last stream entry it dispatched on
+    each topic that has clients. Once a (re)connect is confirmed it first
+    dispatches the stream entries after those, then continues live; clients
+    skip the duplicates by entry id.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients: dict[str, set[queue.Queue]] = defaultdict(set)
+        self._last_ids: dict[str, str] = {}  # topic -> last entry dispatched to its clients
+        self._ready = threading.Event()  # set while the patterns are confirmed subscribed
+        self._reader: Optional[threading.Thread] = None
+
+    def subscribe(self, topics: Iterable[str]) -> queue.Queue:
+        """
+        Register a client queue for `topics`. Returns once the shared subscriber is
+        listening, so anything published from then on reaches the queue.
+        """
+        topics = list(topics)
+        q: queue.Queue = queue.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        with self._lock:
+            if self._reader is None:
+                r = _get_redis()  # resolve the URL while we may still have an app context
+                self._reader = threading.Thread(target=self._run, args=(r,), name="realtime-fanout", daemon=True)
+                self._reader.start()
+            for topic in topics:
+                self._clients[topic].add(q)
+            untracked = [t for t in topics if t not in self._last_ids]
+        if not self._ready.wait(SUBSCRIBE_WAIT_SEC):
+            log.warning("realtime subscriber not ready after %ss; relying on catch-up", SUBSCRIBE_WAIT_SEC)
+
+        r = _get_redis()
+        for topic in untracked:
+            newest = r.xrevrange(_stream_key(topic), count=1)
+            with self._lock:
+                self._last_ids.setdefault(topic, newest[0][0] if newest else "0-0")
+        return q
+
+    def unsubscribe(self, q: queue.Queue) -> None:
+        with self._lock:
+            for topic in [t for t, queues in self._clients.items() if q in queues]:
+                self._clients[topic].discard(q)
+                if not self._clients[topic]:
+                    del self._clients[topic]
+                    self._last_ids.pop(topic, None)
+
+    def _dispatch(self, channel: str, entry_id: str, raw: str) -> None:
+        with self._lock:
+            queues = list(self._clients.get(channel, ()))
+            last = self._last_ids.get(channel)
+            if queues and (last is None or _entry_key(entry_id) > _entry_key(last)):
+                self._last_ids[channel] = entry_id
+        for q in queues:
+            try:
+                q.put_nowait((channel, entry_id, raw))
+            except queue.Full:
+                log.warning("SSE client queue full; dropping message (topic=%r)", channel)
+
+    def _catch_up(self, r: redis.Redis) -> None:
+        """Dispatch what was added to the clients' topic streams while nothing was listening."""
+        with self._lock:
+            since = {topic: self._last_ids[topic] for topic in self._clients if topic in self._last_ids}
+        for topic, after in since.items():
+            entries, _ = _replay(r, topic, after)
+            for entry_id, raw in entries:
+                self._dispatch(topic, entry_id, raw)
+
+    def _run(self, r: redis.Redis) -> None:
+        patterns = [f"{prefix}*" for prefix in TOPIC_PREFIXES]
+        while True:
+            pubsub = r.pubsub()
+            try:
+                pubsub.psubscribe(*patterns)
+                pending = set(patterns)
+                for msg in pubsub.listen():
+                    kind = msg.get("type") if msg else None
+                    if kind == "pmessage":
+                        entry_id, _, raw = (msg.get("data") or "").partition(" ")
+                        self._dispatch(msg.get("channel") or "", entry_id, raw)
+                    elif kind == "psubscribe" and pending:
+                        pending.discard(msg.get("channel"))
+                        if not pending:
+                            self._catch_up(r)
+                            self._ready.set()
+            except Exception:
+                log.exception("realtime subscriber lost Redis; reconnecting")
+            finally:
+                self._ready.clear()
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+            time.sleep(RECONNECT_SEC)
+
+
+_fanout: Optional[_Fanout] = None
+_fanout_pid: Optional[int] = None
+
+
+def _get_fanout() -> _Fanout:
+    """This process's fan-out (a forked child builds its own rather than sharing the parent's)."""
+    global _fanout, _fanout_pid
+    with _redis_lock:
+        if _fanout is None or _fanout_pid != os.getpid():
+            _fanout, _fanout_pid = _Fanout(), os.getpid()
+        return _fanout
+
+
+def _entry_key(entry_id: str) -> tuple[int, int]:
+    ms, _, n = entry_id.partition("-")
+    return int(ms), int(n or 0)
+
+
+def _encode_positions(positions: dict[str, str]) -> str:
+    """SSE id for a connection: the last stream entry seen on each of its topics."""
+    return ",".join(f"{topic}@{entry_id}" for topic, entry_id in positions.items())
+
+
+def parse_last_event_id(header: Optional[str], topics: Iterable[str]) -> dict[str, str]:
+    """Per-topic positions from a Last-Event-ID header; malformed parts and other topics are ignored."""
+    wanted = set(topics)
+    positions = {}
+    for part in (header or "").split(","):
+        topic, _, entry_id = part.strip().rpartition("@")
+        if topic in wanted:
+            try:
+                _entry_key(entry_id)
+            except ValueError:
+                continue
+            positions[topic] = entry_id
+    return positions
+
+
+def _format_sse(channel: str, raw: str, event_id: Optional[str] = None) -> bytes:
+    extra = {}
+    try:
+        parsed = json.loads(raw)
+        event_name = parsed.get("event") or "message"
+        payload = parsed.get("data") or {}
+        extra = {k: parsed[k] for k in ("seq", "patch") if k in parsed}
+    except (ValueError, TypeError):
+        event_name = "message"
+        payload = {"raw": raw}
+    # Wrap the payload so the client knows which topic fired (and in which order).
+    payload = {"topic": channel, **extra, **payload}
+    return (
+        (f"id: {event_id}\n" if event_id else "")
+        + f"event: {event_name}\n"
+        f"data: {json.dumps(payload)}\n\n"
+    ).encode("utf-8")
+
+
+def _replay(r: redis.Redis, topic: str, after: str) -> tuple[list[tuple[str, str]], bool]:
+    """
+    Stream entries of `topic` after entry `after`, and whether that is all of them (False
+    when `after` has been trimmed or expired, so the client may have missed more).
+    """
+    entries = r.xrange(_stream_key(topic), min=after, max="+", count=STREAM_MAXLEN + 1)
+    if after == "0-0":
+        complete = True
+    else:
+        complete = bool(entries) and entries[0][0] == after
+    return [(entry_id, fields.get("msg") or "{}") for entry_id, fields in entries if entry_id != after], complete
+
+
+def stream(topics: Iterable[str], last_event_id: Optional[str] = None) -> Iterator[bytes]:
     """
     Generator that yields SSE-formatted byte chunks for the given topics.
 
-    Subscribes via Redis pubsub, emits events as they arrive, and inserts
-    a `:keepalive` comment every ~25s of silence so intermediaries don't
-    close the idle connection.
+    Registers a queue with the worker's shared subscriber, replays whatever the
+    client missed since `last_event_id` (its Last-Event-ID header), then emits
+    events as they arrive, and inserts a `:keepalive` comment every ~25s of
+    silence so intermediaries don't close the idle connection.
 
-    Cleans up the pubsub on generator close (client disconnect / reload).
+    Unregisters on generator close (client disconnect / reload).
     """
     topics = list(topics)
-    r = _get_redis()
-    pubsub = r.pubsub(ignore_subscribe_messages=True)
+    fanout = _get_fanout()
+    q = fanout.subscribe(topics)  # before reading the streams, so nothing falls in between
     try:
-        pubsub.subscribe(*topics)
-        # Initial flush: tells the client the stream is live, also forces
-        # any proxy to commit headers immediately.
-        yield b": connected\n\n"
-        last_send = time.monotonic()
+        r = _get_redis()
+        since = parse_last_event_id(last_event_id, topics)
+        positions: dict[str, str] = {}
+        replay: list[tuple[str, str, str]] = []
+        resync: list[str] = []
+        for topic in topics:
+            if topic in since:
+                entries, complete = _replay(r, topic, since[topic])
+                if not complete:
+                    resync.append(topic)
+                replay.extend((topic, entry_id, raw) for entry_id, raw in entries)
+                positions[topic] = since[topic]
+            else:
+                # new to this client: start from the newest entry ("0-0" = from the beginning of an empty stream)
+                newest = r.xrevrange(_stream_key(topic), count=1)
+                positions[topic] = newest[0][0] if newest else "0-0"
+
+        # Initial flush: tells the client the stream is live (and where it starts),
+        # also forces any proxy to commit headers immediately.
+        yield f"id: {_encode_positions(positions)}\n: connected\n\n".encode("utf-8")
+        for topic in resync:
+            yield _format_sse(topic, json.dumps({"event": "resync", "data": {}}))
+        replay.sort(key=lambda item: _entry_key(item[1]))
+        for channel, entry_id, raw in replay:
+            positions[channel] = entry_id
+            yield _format_sse(channel, raw, _encode_positions(positions))
+
         while True:
-            msg = pubsub.get_message(timeout=POLL_SEC)
-            if msg is not None:
-                # msg = {'type': 'message', 'channel': 'hike:42', 'data': '{...}'}
-                channel = msg.get("channel") or ""
-                raw = msg.get("data") or "{}"
-                try:
-                    parsed = json.loads(raw)
-                    event_name = parsed.get("event") or "message"
-                    payload = parsed.get("data") or {}
-                except (ValueError, TypeError):
-                    event_name = "message"
-                    payload = {"raw": raw}
-                # Wrap the payload so the client knows which topic fired.
-                payload = {"topic": channel, **payload}
-                chunk = (
-                    f"event: {event_name}\n"
-                    f"data: {json.dumps(payload)}\n\n"
-                ).encode("utf-8")
-                yield chunk
-                last_send = time.monotonic()
-            elif time.monotonic() - last_send >= KEEPALIVE_SEC:
+            try:
+                channel, entry_id, raw = q.get(timeout=KEEPALIVE_SEC)
+            except queue.Empty:
                 yield b": keepalive\n\n"
-                last_send = time.monotonic()
+                continue
+            last = positions.get(channel)
+            if last is not None and _entry_key(entry_id) <= _entry_key(last):
+                continue  # already replayed
+            positions[channel] = entry_id
+            yield _format_sse(channel, raw, _encode_positions(positions))
     except (GeneratorExit, KeyboardInterrupt):
         # Normal client disconnect.
         raise
     except Exception:
         log.exception("SSE stream errored (topics=%r)", topics)
     finally:
-        try:
-            pubsub.unsubscribe()
-        except Exception:
-            pass
-        try:
-            pubsub.close()
-        except Exception:
-            pass
+        fanout.unsubscribe(q)
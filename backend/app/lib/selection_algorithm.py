@@ -1,126 +1,161 @@
+import json
+import logging
+from datetime import datetime, timezone
 from typing import List
 
-from ..models import Hike, Signup, Vehicle
+from flask import current_app
 
+from .. import db
+from ..models import Hike, Member, Signup, Vehicle
+from .fairness import attendance_bitmaps, get_scorer
+from .realtime import _get_redis, on_publish
 
+log = logging.getLogger(__name__)
 
-def calc_passenger_capacity(drivers: List[Signup]) -> int:
-    """Returns a list of signup ids to set as confirmed, and a list of signup ids to set as waitlisted in order
-    (first item is first on the waistlist)"""
-    vehicle_ids = [d.vehicle_id for d in drivers if d.vehicle_id]
-    if not vehicle_ids:
-        return 0
-    vehicles = Vehicle.query.filter(Vehicle.id.in_(vehicle_ids)).all()
-    cap_by_id = {v.id: v.passenger_seats for v in vehicles}
-    return sum(cap_by_id.get(d.vehicle_id, 0) for d in drivers)
+# Dry-run results are cached per hike until its roster changes; the TTL is only a backstop
+# for changes that don't announce themselves (e.g. a driver editing their vehicle's seats).
+PREVIEW_TTL_SEC = 300
 
 
-def run(hike_id: int) -> tuple[List[int], List[int]]:
+def run(hike_id: int, extra_capacity: int = 0) -> tuple[List[int], List[int]]:
+    """
+    Returns a list of signup ids to set as confirmed, and a list of signup ids to set as waitlisted in order
+    (first item is first on the waitlist).
+
+    Drivers and self-transports are always confirmed. If there are more passengers than seats, passengers
+    are ranked by the configured fairness score over the last SELECTION_LOOKBACK_HIKES past hikes of this
+    academic year (see fairness.py), with ties broken by signup time. By default that is:
+      1) missed both of the last two hikes
+      2) missed the last hike but attended the one before it
+      3) attended the last hike
+    Runs a fixed number of queries regardless of the number of signups, and sorts once. Only reads;
+    `extra_capacity` adds hypothetical passenger seats (see `preview`).
+    """
+    confirmed, waitlisted, _ = _select(hike_id, extra_capacity)
+    return confirmed, waitlisted
+
+
+def _select(hike_id: int, extra_capacity: int = 0) -> tuple[List[int], List[int], int]:
     from .model_utils import get_current_ay_start
     current_hike = Hike.query.get(hike_id)
     confirmed: List[int] = []
     waitlisted: List[int] = []
 
-    pending_drivers = Signup.query.filter_by(hike_id=hike_id, status="pending", transport_type="driver").all()
-    pending_selfs = Signup.query.filter_by(hike_id=hike_id, status="pending", transport_type="self").all()
-    pending_passengers = (Signup.query
-                          .filter_by(hike_id=hike_id, status="pending", transport_type="passenger")
-                          .order_by(Signup.signup_date.asc())
-                          .all()
-                          )
+    # every pending signup, with its vehicle's seats (drivers), in one query
+    pending = (db.session.query(Signup, Vehicle.passenger_seats)
+               .outerjoin(Vehicle, Vehicle.id == Signup.vehicle_id)
+               .filter(Signup.hike_id == hike_id, Signup.status == "pending")
+               .order_by(Signup.signup_date.asc(), Signup.id.asc())
+               .all()
+               )
+    pending_drivers = [(s, seats) for s, seats in pending if s.transport_type == "driver"]
+    pending_selfs = [s for s, _ in pending if s.transport_type == "self"]
+    pending_passengers = [s for s, _ in pending if s.transport_type == "passenger"]
 
-    ay_start = get_current_ay_start()
-    past_hikes = (Hike.query
-                  .filter(Hike.status == "past")
-                  .filter(Hike.hike_date >= ay_start)
-                  .filter(Hike.hike_date < current_hike.hike_date)
-                  .filter(Hike.id != current_hike.id)
-                  .order_by(Hike.hike_date.desc())
-                  .limit(2)
-                  .all()
-                  )
-
-    passenger_capacity = calc_passenger_capacity(pending_drivers)
+    passenger_capacity = sum(seats or 0 for s, seats in pending_drivers if s.vehicle_id) + extra_capacity
+    total_capacity = passenger_capacity
 
     # drivers and self-transports are always confirmed
-    confirmed += [d.id for d in pending_drivers]
+    confirmed += [d.id for d, _ in pending_drivers]
     confirmed += [s.id for s in pending_selfs]
 
     if passenger_capacity >= len(pending_passengers):
         # we have enough capacity for everyone
         confirmed += [p.id for p in pending_passengers]
-    else:
-        # determine who goes on the waitlist
-        if len(past_hikes) == 0:
-            # no past hike data available, assign by signup time
-            while len(pending_passengers) > 0:
-                chosen_passenger = pending_passengers.pop(0)
-                if passenger_capacity > 0:
-                    confirmed.append(chosen_passenger.id)
-                    passenger_capacity -= 1
-                else:
-                    waitlisted.append(chosen_passenger.id)
-
-        elif len(past_hikes) == 1:
-            # only data available from 1 previous hike
-            last_id = past_hikes[0].id
-
-            # Group passengers by whether they attended the last hike
-            never_last = []
-            did_last = []
-
-            for p in list(pending_passengers):  # iterate over a copy
-                went_last = Signup.query.filter_by(member_id=p.member_id, hike_id=last_id).first() is not None
-                if went_last:
-                    did_last.append(p)
-                else:
-                    never_last.append(p)
-
-            # Priority: never_last -> did_last
-            ordered = never_last + did_last
-
-            for p in ordered:
-                if passenger_capacity > 0:
-                    confirmed.append(p.id)
-                    passenger_capacity -= 1
-                else:
-                    waitlisted.append(p.id)
-
-            pending_passengers.clear()
-
-        elif len(past_hikes) == 2:
-            last_id = past_hikes[0].id  # most recent (previous) hike
-            two_ago_id = past_hikes[1].id  # two hikes ago
-
-            # Priorities:
-            # 1) missed both last and two-ago
-            # 2) missed last but attended two-ago
-            # 3) attended last (regardless of two-ago)
-            missed_both = []
-            missed_last_attended_two_ago = []
-            attended_last = []
-
-            for p in list(pending_passengers):
-                went_last = Signup.query.filter_by(member_id=p.member_id, hike_id=last_id).first() is not None
-                went_two_ago = Signup.query.filter_by(member_id=p.member_id, hike_id=two_ago_id).first() is not None
-
-                if not went_last and not went_two_ago:
-                    missed_both.append(p)
-                elif not went_last and went_two_ago:
-                    missed_last_attended_two_ago.append(p)
-                else:
-                    attended_last.append(p)
-
-            ordered = missed_both + missed_last_attended_two_ago + attended_last
-
-            for p in ordered:
-                if passenger_capacity > 0:
-                    confirmed.append(p.id)
-                    passenger_capacity -= 1
-                else:
-                    waitlisted.append(p.id)
-
-            pending_passengers.clear()
-
-    return confirmed, waitlisted
+        return confirmed, waitlisted, total_capacity
 
+    ay_start = get_current_ay_start()
+    past_hike_ids = [h_id for (h_id,) in (db.session.query(Hike.id)
+                                          .filter(Hike.status == "past")
+                                          .filter(Hike.hike_date >= ay_start)
+                                          .filter(Hike.hike_date < current_hike.hike_date)
+                                          .filter(Hike.id != current_hike.id)
+                                          .order_by(Hike.hike_date.desc())
+                                          .limit(current_app.config["SELECTION_LOOKBACK_HIKES"])
+                                          )]
+    bitmaps = attendance_bitmaps([p.member_id for p in pending_passengers], past_hike_ids)
+    score = get_scorer()
+    k = len(past_hike_ids)
+
+    # sorted() is stable, so signup order is kept within each score
+    for p in sorted(pending_passengers, key=lambda p: score(bitmaps.get(p.member_id, 0), k)):
+        if passenger_capacity > 0:
+            confirmed.append(p.id)
+            passenger_capacity -= 1
+        else:
+            waitlisted.append(p.id)
+
+    return confirmed, waitlisted, total_capacity
+
+
+def _preview_version_key(hike_id: int) -> str:
+    return f"selection-preview-version:hike:{hike_id}"
+
+
+@on_publish("roster_updated", "phase_changed")
+def _invalidate_on_event(topic: str, data: dict) -> None:
+    if topic.startswith("hike:"):
+        invalidate_preview(int(topic.split(":", 1)[1]))
+
+
+def invalidate_preview(hike_id: int) -> None:
+    """Drop every cached dry run for this hike."""
+    try:
+        _get_redis().incr(_preview_version_key(hike_id))
+    except Exception:
+        log.exception("could not bump selection preview version (hike_id=%s)", hike_id)
+
+
+def preview(hike_id: int, extra_capacity: int = 0) -> dict:
+    """
+    Dry run of the waiver cutover: who `run` would confirm and waitlist right now, optionally with
+    `extra_capacity` hypothetical passenger seats. Reads one consistent (read-only on Postgres)
+    snapshot and never writes; the session is rolled back afterwards. Results are cached in Redis
+    until the hike's next roster_updated / phase_changed event.
+    """
+    r = _get_redis()
+    cache_key = None
+    try:
+        version = r.get(_preview_version_key(hike_id)) or "0"
+        cache_key = f"selection-preview:hike:{hike_id}:v{version}:extra:{extra_capacity}"
+        cached = r.get(cache_key)
+        if cached:
+            return {**json.loads(cached), "cached": True}
+    except Exception:
+        log.exception("selection preview cache unavailable (hike_id=%s)", hike_id)
+
+    db.session.rollback()  # start a fresh transaction for the snapshot
+    if db.engine.dialect.name == "postgresql":
+        db.session.connection(execution_options={"isolation_level": "REPEATABLE READ",
+                                                 "postgresql_readonly": True})
+    try:
+        confirmed, waitlisted, capacity = _select(hike_id, extra_capacity)
+        ids = confirmed + waitlisted
+        rows = (db.session.query(Signup.id, Signup.member_id, Member.name, Signup.transport_type)
+                .join(Member, Member.id == Signup.member_id)
+                .filter(Signup.id.in_(ids))
+                .all()
+                ) if ids else []
+    finally:
+        db.session.rollback()
+
+    by_id = {
+        sid: {"signup_id": sid, "member_id": member_id, "name": name, "transport_type": transport_type}
+        for sid, member_id, name, transport_type in rows
+    }
+    result = {
+        "hike_id": hike_id,
+        "extra_capacity": extra_capacity,
+        "passenger_capacity": capacity,
+        "confirmed": [by_id[sid] for sid in confirmed if sid in by_id],
+        "waitlisted": [{**by_id[sid], "waitlist_pos": pos}
+                       for pos, sid in enumerate((sid for sid in waitlisted if sid in by_id), 1)],
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+    if cache_key:
+        try:
+            r.set(cache_key, json.dumps(result), ex=PREVIEW_TTL_SEC)
+        except Exception:
+            log.exception("could not cache selection preview (hike_id=%s)", hike_id)
+    return {**result, "cached": False}
@@ -0,0 +1,138 @@
+"""
+Rendering of signed waivers into flattened PDFs, inline or in a pool of worker processes.
+
+A `WaiverRenderJob` carries everything the template needs as plain values, so the
+rendering itself never touches the database or the Flask app and can run in a child
+process. Children are forked from the Celery worker, so they inherit the waiver
+template and widget index that were pre-warmed at worker start. Jobs whose PDF is
+already in the waiver store are read back from disk instead of being rendered.
+"""
+
+from collections import deque
+from dataclasses import dataclass
+from itertools import islice
+from typing import Iterable, Iterator
+from zoneinfo import ZoneInfo
+
+from billiard.pool import Pool  # Celery's multiprocessing fork: may be used from (daemonic) worker processes
+
+from .. import db
+from ..models import Hike, Trail, Waiver, WaiverSignature
+from .waiver_store import stored_pdf_path
+from .pdftools import fill_signature, fill_text_rich, open_waiver_template, waiver_widget_index
+
+
+@dataclass(frozen=True)
+class WaiverRenderJob:
+    waiver_id: int
+    print_name: str
+    trail_name: str
+    hike_date: str  # already localized + formatted
+    signed_on: str  # already localized + formatted
+    is_minor: bool
+    age: int | None
+    filename: str
+    pdf_path: str | None = None  # stored PDF (see waiver_store), if it was already rendered
+    signature_1: bytes | None = None  # only loaded when the PDF has to be rendered
+    signature_2: bytes | None = None
+
+
+def waiver_render_job(waiver: Waiver, hike: Hike, trail: Trail, tz: ZoneInfo, member_name: str,
+                      signatures: WaiverSignature | None = None) -> WaiverRenderJob:
+    """
+    Snapshot one waiver (plus its hike and trail) into a job. Needs an app context.
+    Signature images are only needed if the PDF isn't stored yet; pass them as
+    `signatures` if already loaded, otherwise they are fetched (one small query).
+    """
+    hike_date = hike.get_localized_time("hike_date")
+    # localize waiver-signed dates to server timezone (probably America/Los_Angeles).
+    signed_on = waiver.signed_on.replace(tzinfo=ZoneInfo("UTC")).astimezone(tz)
+    pdf_path = stored_pdf_path(waiver.pdf_sha256)
+    sigs = None if pdf_path else (signatures or waiver.signatures)
+    return WaiverRenderJob(
+        waiver_id=waiver.id,
+        print_name=waiver.print_name,
+        trail_name=trail.name.title(),
+        hike_date=hike_date.strftime("%A %B %d, %Y"),
+        signed_on=signed_on.strftime("%m/%d/%Y"),
+        is_minor=waiver.is_minor,
+        age=waiver.age,
+        filename=f"{member_name.title()} - {trail.name.title()} {hike_date.strftime('%m-%d-%Y')}.pdf",
+        pdf_path=pdf_path,
+        signature_1=sigs.signature_1 if sigs else None,
+        signature_2=sigs.signature_2 if sigs else None,
+    )
+
+
+def waiver_render_jobs(rows: Iterable[tuple[Waiver, Hike, Trail, str]], tz: ZoneInfo,
+                       batch_size: int = 50) -> Iterator[WaiverRenderJob]:
+    """
+    `waiver_render_job` for each (waiver, hike, trail, member_name) row, consumed lazily.
+    The signatures of the waivers that still need rendering are fetched with one query
+    per `batch_size` rows rather than one per waiver.
+    """
+    rows = iter(rows)
+    while batch := list(islice(rows, batch_size)):
+        unstored = [waiver.id for waiver, *_ in batch if not stored_pdf_path(waiver.pdf_sha256)]
+        sigs = {}
+        if unstored:
+            sigs = {s.waiver_id: s for s in
+                    db.session.query(WaiverSignature).filter(WaiverSignature.waiver_id.in_(unstored))}
+        for waiver, hike, trail, member_name in batch:
+            yield waiver_render_job(waiver, hike, trail, tz, member_name, signatures=sigs.get(waiver.id))
+
+
+def _read_stored(job: WaiverRenderJob) -> bytes:
+    with open(job.pdf_path, "rb") as f:
+        return f.read()
+
+
+def render_waiver(job: WaiverRenderJob) -> bytes:
+    """Fill the waiver template for one job and return the flattened PDF bytes."""
+    index = waiver_widget_index()
+    doc = open_waiver_template()
+
+    # Always will be filled:
+    fill_text_rich(doc, index, "fname", job.print_name, font_size=16)
+    fill_text_rich(doc, index, "event_description",
+                   f"PARTICIPANT SPORTING EVENT DESCRIPTION: <b>{job.trail_name}</b>")
+    fill_text_rich(doc, index, "event_date", f"SPORTING EVENT DATE: <b>{job.hike_date}</b>")
+
+    suffix = "minor" if job.is_minor else "user"
+    fill_signature(doc, index, f"sig1_{suffix}", job.signature_1)
+    fill_signature(doc, index, f"sig2_{suffix}", job.signature_2)
+    fill_text_rich(doc, index, f"date1_{suffix}", job.signed_on, font_size=12)
+    fill_text_rich(doc, index, f"date2_{suffix}", job.signed_on, font_size=12)
+    if job.is_minor:
+        fill_text_rich(doc, index, "age", str(job.age))
+
+    # flatten and serialize
+    doc.bake()
+    pdf_bytes = doc.write(deflate=True, clean=True, garbage=4)
+    doc.close()
+    return pdf_bytes
+
+
+def render_waivers(jobs: Iterable[WaiverRenderJob], processes: int = 1) -> Iterator[tuple[WaiverRenderJob, bytes]]:
+    """
+    Render jobs in order, yielding (job, pdf_bytes) as each one is ready. `jobs` is
+    consumed lazily and at most 2 * `processes` PDFs are in flight at once, so memory
+    stays flat however many waivers there are. processes <= 1 renders inline. Stored
+    PDFs are read from disk in the calling process.
+    """
+    if processes <= 1:
+        for job in jobs:
+            yield job, _read_stored(job) if job.pdf_path else render_waiver(job)
+        return
+
+    with Pool(processes=processes) as pool:
+        in_flight = deque()
+        for job in jobs:
+            result = None if job.pdf_path else pool.apply_async(render_waiver, (job,))
+            in_flight.append((job, result))
+            if len(in_flight) >= 2 * processes:
+                done, result = in_flight.popleft()
+                yield done, _read_stored(done) if result is None else result.get()
+        while in_flight:
+            done, result = in_flight.popleft()
+            yield done, _read_stored(done) if result is None else result.get()
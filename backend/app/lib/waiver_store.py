@@ -0,0 +1,63 @@
+"""
+Content-addressed store for baked waiver PDFs.
+
+A waiver is rendered once (when it is signed, or by `flask backfill-waiver-pdfs`) and
+its PDF saved as WAIVER_STORE_DIR/<sha256[:2]>/<sha256>.pdf; the digest is kept on
+`Waiver.pdf_sha256`. Exports and resends then copy the stored file instead of
+re-rendering the template.
+"""
+
+import hashlib
+import os
+import tempfile
+from typing import Optional
+
+from flask import current_app
+from sqlalchemy import update
+
+from .. import db
+from ..models import Waiver
+
+
+def _path_for(digest: str, store_dir: str = None) -> str:
+    store_dir = store_dir or current_app.config["WAIVER_STORE_DIR"]
+    return os.path.join(store_dir, digest[:2], f"{digest}.pdf")
+
+
+def store_pdf(pdf_bytes: bytes) -> str:
+    """Save PDF bytes (if not already stored) and return their sha256 hex digest."""
+    digest = hashlib.sha256(pdf_bytes).hexdigest()
+    path = _path_for(digest)
+    if os.path.exists(path):
+        return digest
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # write-then-rename so a reader never sees a partial file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(pdf_bytes)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return digest
+
+
+def stored_pdf_path(digest: Optional[str]) -> Optional[str]:
+    """Path of a stored PDF, or None if there is no digest or the file is gone."""
+    if not digest:
+        return None
+    path = _path_for(digest)
+    return path if os.path.exists(path) else None
+
+
+def record_pdf_digests(digests: dict[int, str]) -> None:
+    """Set `Waiver.pdf_sha256` for {waiver_id: digest} in one executemany, and commit."""
+    if not digests:
+        return
+    db.session.execute(update(Waiver), [{"id": wid, "pdf_sha256": d} for wid, d in digests.items()])
+    db.session.commit()
@@ -86,9 +86,19 @@ class Waiver(db.Model):
     print_name = db.Column(db.String(50), nullable=False)
     is_minor  = db.Column(db.Boolean, nullable=False)
     age       = db.Column(db.Integer, nullable=True)
-    signature_1_b64 = db.Column(db.Text, nullable=False)
-    signature_2_b64 = db.Column(db.Text, nullable=False)
     signed_on = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    pdf_sha256 = db.Column(db.String(64), nullable=True)  # baked PDF in WAIVER_STORE_DIR, see lib/waiver_store.py
+
+    # signature images live in their own table and are only loaded when accessed
+    signatures = db.relationship('WaiverSignature', uselist=False, lazy='select', cascade='all, delete-orphan')
+
+
+class WaiverSignature(db.Model):
+    __tablename__ = 'waiver_signatures'
+    waiver_id   = db.Column(db.Integer, db.ForeignKey('waivers.id', ondelete='CASCADE'), primary_key=True)
+    mimetype    = db.Column(db.String(50), nullable=False, default='image/png')
+    signature_1 = db.Column(db.LargeBinary, nullable=False)  # decoded image bytes
+    signature_2 = db.Column(db.LargeBinary, nullable=False)
 
 
 
@@ -168,6 +178,12 @@ class EmailTask(db.Model):
     sent_at           = db.Column(db.DateTime, nullable=True)
     # Only set for manual-campaign tasks; bulk campaign type is implied by EmailCampaign.type
     email_type        = db.Column(db.String(50), nullable=True)
+    # Set while a batch sender holds the row; a lease older than MAIL_CLAIM_LEASE_SEC is reclaimable
+    claimed_at        = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_email_tasks_campaign_id_status', 'campaign_id', 'status'),
+    )
 
     def __repr__(self):
         return f'<MagicLink {self.token}>'
@@ -8,9 +8,10 @@ from datetime import datetime, timezone, timedelta
 from .. import db
 from ..decorators import admin_required, waiver_phase_required
 from ..models import Trail, Vote, Member, Signup, Vehicle, Waiver, MagicLink, Hike
-from ..lib.model_utils import current_active_hike, get_current_ay_start, update_waitlist
-from ..lib import phases
+from ..lib.model_utils import candidate_votes, current_active_hike, get_current_ay_start, update_waitlist
+from ..lib import dashboard_snapshot, phase_schedule, phases, selection_algorithm
 from ..lib.realtime import publish_event
+from ..lib.email_templates import invalidate_email_batches
 from ..lib.email_record import create_manual_task
 
 dashboard: Blueprint = Blueprint("dashboard", __name__)
@@ -19,11 +20,39 @@ dashboard: Blueprint = Blueprint("dashboard", __name__)
 @dashboard.route('/upcoming', methods=['GET'])
 @admin_required
 def get_active_hike_info():
+    """
+    Served from the hike's cached dashboard snapshot (see lib/dashboard_snapshot.py) with the
+    snapshot version as ETag; clients holding the current version get a 304.
+    """
     # Determine current active hike + phase
     hike = current_active_hike()
     if hike is None:
         return jsonify(status=None), 200
 
+    version = dashboard_snapshot.current_version(hike.id)
+    if version is None:  # no cache available
+        data, status = _upcoming_payload(hike)
+        return jsonify(data), status
+
+    etag = dashboard_snapshot.etag(hike.id, version)
+    if request.if_none_match.contains(etag):
+        resp = current_app.response_class(status=304)
+    else:
+        body = dashboard_snapshot.load(hike.id, version)
+        if body is None:
+            data, status = _upcoming_payload(hike)
+            if status != 200:
+                return jsonify(data), status
+            body = current_app.json.dumps(data)
+            dashboard_snapshot.store(hike.id, version, body)
+        resp = current_app.response_class(body, mimetype="application/json")
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "private, no-cache"  # always revalidate; the ETag makes that cheap
+    return resp
+
+
+def _upcoming_payload(hike: Hike) -> tuple[dict, int]:
+    """The /upcoming payload for the active hike, and the HTTP status to send it with."""
     return_data = {"hike_id": hike.id}
     phase = (hike.phase or "").lower()
     if not phase:
@@ -55,97 +84,89 @@ def get_active_hike_info():
 
     # VOTING: summarize candidate trails + voters (from Vote rows)
     if phase == "voting":
-        # Each vote row ties this active hike to a candidate Trail via Vote.trail_id
-        # Build candidate list with counts, then attach voter names per trail.
-        candidates = Trail.query.filter_by(is_active_vote_candidate=True).all()
-
         results = []
-        for row in candidates:
-            # Names of voters for this trail in this active hike
-            voter_rows = (
-                db.session.query(Member.name)
-                .join(Vote, Member.id == Vote.member_id)
-                .filter(and_(Vote.hike_id == hike.id, Vote.trail_id == row.id))
-                .all()
-            )
-            names = [r.name for r in voter_rows]
+        for trail, names in candidate_votes(hike.id):
             results.append({
-                "trail_id": row.id,
-                "trail_name": row.name,
-                "trail_alltrails_url": row.alltrails_url,
+                "trail_id": trail.id,
+                "trail_name": trail.name,
+                "trail_alltrails_url": trail.alltrails_url,
                 "trail_num_votes": len(names),
                 "trail_voters": names,
             })
 
         return_data["trails"] = results
-        return jsonify(return_data), 200
+        return return_data, 200
 
     # SIGNUPS or WAIVER: report selected trail + roster + capacity
     elif phase in ("signup", "waiver"):
         if not hike.trail_id:
             # Should not happen once a trail is chosen, but guard anyway.
-            return jsonify(error="Active hike has no trail selected yet"), 409
+            return {"error": "Active hike has no trail selected yet"}, 409
 
         trail: Trail | None = Trail.query.get(hike.trail_id)
         if not trail:
-            return jsonify(error="Selected trail not found"), 404
+            return {"error": "Selected trail not found"}, 404
 
         return_data["trail_id"] = trail.id
         return_data["trail_name"] = trail.name
         return_data["trail_alltrails_url"] = trail.alltrails_url
 
+        # one query for the whole roster, drivers' vehicles included
         rows = (
             db.session.query(
-                Member,
+                Member.id,
+                Member.name,
                 Signup.status,
                 Signup.transport_type,
                 Signup.food_interest,
                 Signup.is_checked_in,
                 Signup.vehicle_id,
                 Waiver.id.label("waiver_id"),
+                Vehicle.year,
+                Vehicle.make,
+                Vehicle.model,
+                Vehicle.passenger_seats,
             )
             .join(Signup, Member.id == Signup.member_id)
             .outerjoin(
                 Waiver,
                 and_(Waiver.member_id == Member.id, Waiver.hike_id == hike.id),
             )
+            .outerjoin(Vehicle, Vehicle.id == Signup.vehicle_id)
             .filter(Signup.hike_id == hike.id)
             .all()
         )
 
         users = []
         total_capacity = 0
-        for member, signup_status, transport_type, food_interest, is_checked_in, vehicle_id, waiver_id in rows:
+        num_confirmed_passengers = 0
+        for row in rows:
             user_obj = {
-                "member_id": member.id,
-                "name": member.name,
-                "transport_type": transport_type,
-                "food_interest": food_interest,
-                "has_waiver": waiver_id is not None,
-                "is_checked_in": is_checked_in,
+                "member_id": row.id,
+                "name": row.name,
+                "transport_type": row.transport_type,
+                "food_interest": row.food_interest,
+                "has_waiver": row.waiver_id is not None,
+                "is_checked_in": row.is_checked_in,
             }
-            if transport_type == "driver":
-                vehicle = Vehicle.query.get(vehicle_id)
-                user_obj["vehicle_id"] = vehicle_id
-                user_obj["vehicle_desc"] = f"{vehicle.year} {vehicle.make} {vehicle.model}"
-                user_obj["vehicle_capacity"] = int(vehicle.passenger_seats)
-                total_capacity += int(vehicle.passenger_seats)
+            if row.transport_type == "driver":
+                user_obj["vehicle_id"] = row.vehicle_id
+                user_obj["vehicle_desc"] = f"{row.year} {row.make} {row.model}"
+                user_obj["vehicle_capacity"] = int(row.passenger_seats)
+                total_capacity += int(row.passenger_seats)
+            elif row.transport_type == "passenger" and row.status == "confirmed":
+                num_confirmed_passengers += 1
             users.append(user_obj)
 
         return_data["users"] = users
         return_data["passenger_capacity"] = total_capacity
         if phase == "waiver":
-            num_confirmed_passengers = (
-                db.session.query(Signup)
-                .filter_by(hike_id=hike.id, transport_type="passenger", status="confirmed")
-                .count()
-            )
             if total_capacity < num_confirmed_passengers:
                 return_data["over_capacity_passengers"] = num_confirmed_passengers - total_capacity
-        return jsonify(return_data), 200
+        return return_data, 200
 
     # Any other phase → just return the phase for now
-    return jsonify(return_data), 200
+    return return_data, 200
 
 
 @dashboard.route('/vote-counts', methods=['GET'])
@@ -155,17 +176,10 @@ def get_vote_counts():
     if not hike or hike.phase != 'voting':
         return jsonify(error="No active voting phase"), 404
 
-    candidates = Trail.query.filter_by(is_active_vote_candidate=True).all()
-    results = []
-    for row in candidates:
-        voter_rows = (
-            db.session.query(Member.name)
-            .join(Vote, Member.id == Vote.member_id)
-            .filter(and_(Vote.hike_id == hike.id, Vote.trail_id == row.id))
-            .all()
-        )
-        names = [r.name for r in voter_rows]
-        results.append({"trail_id": row.id, "trail_num_votes": len(names), "trail_voters": names})
+    results = [
+        {"trail_id": trail.id, "trail_num_votes": len(names), "trail_voters": names}
+        for trail, names in candidate_votes(hike.id)
+    ]
     return jsonify({"trails": results}), 200
 
 
@@ -210,6 +224,7 @@ def swap_vote_trail():
     )
 
     db.session.commit()
+    invalidate_email_batches(hike.id)
     publish_event(f"hike:{hike.id}", "vote_updated", {})
 
     return jsonify(
@@ -241,6 +256,7 @@ def switch_hike_trail():
 
     hike.trail_id = trail_id
     db.session.commit()
+    invalidate_email_batches(hike.id)
     publish_event(f"hike:{hike.id}", "roster_updated", {"trail_id": trail.id})
 
     return jsonify(
@@ -333,6 +349,13 @@ def set_next_hike():
     db.session.commit()
 
     current_app.extensions["celery"].send_task("app.tasks.start_email_campaign", args=[new_hike.id])
+    # The hike exists and its campaign is queued, so a Redis failure here must not turn into
+    # an error (an officer retrying would create a second hike). The */10 check_and_update_phase
+    # beat job advances unscheduled phases anyway, at most ten minutes late.
+    try:
+        phase_schedule.schedule_phase_transition(new_hike)
+    except Exception:
+        current_app.logger.exception("could not schedule the phase transition of hike %s", new_hike.id)
 
     return jsonify(success=True), 200
 
@@ -364,6 +387,23 @@ def get_waitlist():
 
     return jsonify(waitlist_users), 200
 
+@dashboard.route('/selection-preview', methods=['GET'])
+@admin_required
+def get_selection_preview():
+    """Who the waiver cutover would confirm / waitlist right now. Query: extra_capacity (seats, default 0)."""
+    hike = current_active_hike()
+    if not hike:
+        return jsonify(error="No active hike"), 400
+    if hike.phase != "signup":
+        return jsonify(error="Selection preview is only available during the signup phase"), 400
+
+    extra_capacity = request.args.get('extra_capacity', 0, type=int)
+    if extra_capacity < 0:
+        return jsonify(error="extra_capacity must be a non-negative integer"), 400
+
+    return jsonify(selection_algorithm.preview(hike.id, extra_capacity)), 200
+
+
 @dashboard.route("/list-emails", methods=["GET"])
 @admin_required
 def list_all_emails():
@@ -461,6 +501,7 @@ def check_in():
             f"hike:{hike.id}",
             "checkin_updated",
             {"signup_id": signup.id, "member_id": user_id, "is_checked_in": True},
+            patch={"users": [{"member_id": user_id, "is_checked_in": True}]},
         )
         return jsonify(success=True), 200
 
@@ -475,6 +516,7 @@ def check_in():
             f"hike:{hike.id}",
             "checkin_updated",
             {"signup_id": signup.id, "member_id": user_id, "is_checked_in": False},
+            patch={"users": [{"member_id": user_id, "is_checked_in": False}]},
         )
         return jsonify(success=True), 200
 
@@ -666,6 +708,17 @@ def _cleanup_stale_exports(max_age_sec=3600):
             pass
 
 
+def _export_path(task_id):
+    """Finished export file for a task (zip or merged pdf), or None."""
+    # Sanitize task_id to prevent path traversal
+    safe_name = os.path.basename(task_id)
+    for ext in ("zip", "pdf"):
+        path = os.path.join(current_app.config["WAIVER_EXPORTS_DIR"], f"{safe_name}.{ext}")
+        if os.path.exists(path):
+            return path
+    return None
+
+
 @dashboard.route('/export-waivers', methods=['POST'])
 @admin_required
 def export_waivers():
@@ -673,8 +726,24 @@ def export_waivers():
 
     data = request.get_json() or {}
     member_id = data.get('member_id')
-    if member_id is None:
-        return jsonify(error="Missing member_id"), 400
+    hike_id = data.get('hike_id')
+    if member_id is None and hike_id is None:
+        return jsonify(error="Missing member_id or hike_id"), 400
+
+    celery_app = current_app.extensions["celery"]
+
+    if hike_id is not None:
+        hike = Hike.query.get(hike_id)
+        if not hike:
+            return jsonify(error="Hike not found"), 404
+
+        waiver_count = Waiver.query.filter_by(hike_id=hike_id).count()
+        if waiver_count == 0:
+            return jsonify(error="Hike has no signed waivers"), 404
+
+        merged = bool(data.get('merged', False))
+        result = celery_app.send_task("app.tasks.export_hike_waivers", args=[hike_id, merged])
+        return jsonify(task_id=result.id, waiver_count=waiver_count, format="pdf" if merged else "zip"), 202
 
     member = Member.query.get(member_id)
     if not member:
@@ -684,7 +753,7 @@ def export_waivers():
     if waiver_count == 0:
         return jsonify(error="Member has no signed waivers"), 404
 
-    result = current_app.extensions["celery"].send_task(
+    result = celery_app.send_task(
         "app.tasks.export_member_waivers", args=[member_id]
     )
     return jsonify(task_id=result.id, member_name=member.name), 202
@@ -693,9 +762,7 @@ def export_waivers():
 @dashboard.route('/export-waivers/<task_id>/status', methods=['GET'])
 @admin_required
 def export_waivers_status(task_id):
-    safe_name = os.path.basename(task_id)
-    zip_path = os.path.join(current_app.config["WAIVER_EXPORTS_DIR"], f"{safe_name}.zip")
-    if os.path.exists(zip_path):
+    if _export_path(task_id):
         return jsonify(status="done"), 200
 
     # Check if task failed via Celery result backend
@@ -703,6 +770,8 @@ def export_waivers_status(task_id):
     result = celery_app.AsyncResult(task_id)
     if result.state == "FAILURE":
         return jsonify(status="failed", error=str(result.result)), 200
+    if result.state == "PROGRESS":
+        return jsonify(status="pending", **(result.info or {})), 200
 
     return jsonify(status="pending"), 200
 
@@ -710,15 +779,14 @@ def export_waivers_status(task_id):
 @dashboard.route('/export-waivers/<task_id>/download', methods=['GET'])
 @admin_required
 def export_waivers_download(task_id):
-    # Sanitize task_id to prevent path traversal
-    safe_name = os.path.basename(task_id)
-    zip_path = os.path.join(current_app.config["WAIVER_EXPORTS_DIR"], f"{safe_name}.zip")
-    if not os.path.exists(zip_path):
+    path = _export_path(task_id)
+    if not path:
         return jsonify(error="Export not found"), 404
 
+    ext = path.rsplit(".", 1)[1]
     return send_file(
-        zip_path,
-        mimetype="application/zip",
+        path,
+        mimetype="application/zip" if ext == "zip" else "application/pdf",
         as_attachment=True,
-        download_name=f"waivers-export-{safe_name[:8]}.zip",
+        download_name=f"waivers-export-{os.path.basename(task_id)[:8]}.{ext}",
     )
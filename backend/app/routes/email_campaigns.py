@@ -3,6 +3,7 @@ from sqlalchemy import func, or_, nullslast
 
 from ..decorators import admin_required
 from ..models import EmailCampaign, EmailTask, Hike, Member, Trail
+from ..lib.rate_limiter import current_send_rate
 from .. import db
 
 email_campaigns: Blueprint = Blueprint("email_campaigns", __name__)
@@ -65,6 +66,9 @@ def list_campaigns_for_hike(hike_id: int):
         c = counts_by_campaign.get(cid, {"pending": 0, "sent": 0, "failed": 0})
         return {**c, "total": c["pending"] + c["sent"] + c["failed"]}
 
+    # shared SMTP send rate, so officers can see when the relay is throttling us
+    send_rate = current_send_rate() if any(c.date_completed is None for c in campaigns) else None
+
     return jsonify([
         {
             "id": c.id,
@@ -73,6 +77,7 @@ def list_campaigns_for_hike(hike_id: int):
             "date_completed": c.date_completed.replace(tzinfo=None).isoformat() + "Z" if c.date_completed else None,
             "in_progress": c.date_completed is None,
             "counts": _counts(c.id),
+            "send_rate": send_rate if c.date_completed is None else None,
         }
         for c in campaigns
     ])
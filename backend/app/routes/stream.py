@@ -1,11 +1,11 @@
 from flask import Blueprint, Response, jsonify, request
 
 from ..decorators import admin_required
-from ..lib.realtime import stream
+from ..lib.realtime import TOPIC_PREFIXES, stream
 
 stream_bp = Blueprint("stream", __name__)
 
-ALLOWED_PREFIXES = ("hike:", "email-campaigns:hike:", "campaign:")
+ALLOWED_PREFIXES = TOPIC_PREFIXES
 MAX_TOPICS = 8
 
 
@@ -31,7 +31,7 @@ def admin_stream():
         return jsonify(error=err), 400
 
     response = Response(
-        stream(topics),
+        stream(topics, request.headers.get("Last-Event-ID")),
         mimetype="text/event-stream",
     )
     # Disable proxy and downstream buffering so events flush immediately.
@@ -3,6 +3,9 @@ import json
 from flask import Blueprint, jsonify, request, current_app
 from ..decorators import admin_required
 from ..models import Trail
+from ..lib import dashboard_snapshot
+from ..lib.email_templates import invalidate_email_batches
+from ..lib.model_utils import current_active_hike
 from .. import db
 
 trails: Blueprint = Blueprint("trails", __name__)
@@ -138,6 +141,12 @@ def update_trail(trail_id):
         trail.driving_distance_mi = data['driving_distance_mi'] or None
 
     db.session.commit()
+
+    # cached email content and the dashboard snapshot for the active hike may include this trail
+    hike = current_active_hike()
+    if hike and (hike.trail_id == trail.id or trail.is_active_vote_candidate):
+        invalidate_email_batches(hike.id)
+        dashboard_snapshot.bump_version(hike.id)
     return jsonify(_serialize_trail(trail))
 
 
@@ -1,10 +1,20 @@
 from flask import Blueprint, request, jsonify, current_app
 from .. import db
+from ..lib.model_utils import candidate_votes
 from ..lib.realtime import publish_event
 from ..models import Member, Hike, Trail, MagicLink, Vote
 
 hike_vote: Blueprint = Blueprint("hike-vote", __name__)
 
+
+def _votes_patch(hike_id: int) -> dict:
+    """New counts for every candidate, as a delta for the admin dashboard (see lib/realtime.py)."""
+    return {"trails": [
+        {"trail_id": trail.id, "trail_num_votes": len(names), "trail_voters": names}
+        for trail, names in candidate_votes(hike_id)
+    ]}
+
+
 @hike_vote.route("", methods=["GET", "POST"])
 def hike_vote_page():
     token = request.args.get("token")
@@ -64,7 +74,7 @@ def hike_vote_page():
         if existing_vote:
             existing_vote.trail_id = vote_trail_id
             db.session.commit()
-            publish_event(f"hike:{hike.id}", "vote_updated", {"member_id": member.id})
+            publish_event(f"hike:{hike.id}", "vote_updated", {"member_id": member.id}, patch=_votes_patch(hike.id))
             return jsonify({"success": True}), 200
 
         vote = Vote(
@@ -74,5 +84,5 @@ def hike_vote_page():
         )
         db.session.add(vote)
         db.session.commit()
-        publish_event(f"hike:{hike.id}", "vote_updated", {"member_id": member.id})
+        publish_event(f"hike:{hike.id}", "vote_updated", {"member_id": member.id}, patch=_votes_patch(hike.id))
         return jsonify({"success": True}), 200
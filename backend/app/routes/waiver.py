@@ -3,7 +3,8 @@ from flask import Blueprint, request, jsonify, current_app, render_template
 
 from ..lib.model_utils import update_waitlist
 from ..lib.realtime import publish_event
-from ..models import Member, Hike, Trail, MagicLink, Waiver, Signup
+from ..lib.pdftools import decode_image_data_url
+from ..models import Member, Hike, Trail, MagicLink, Waiver, WaiverSignature, Signup
 from .. import db
 
 hike_waiver: Blueprint = Blueprint("hike-waiver", __name__)
@@ -90,6 +91,14 @@ def hike_waiver_page():
         # we currently don't perform a check to make sure the signature fields aren't blank.
         # this may be a prudent "just-in-case" addition for the future;
         # I believe this would have to be done by checking if the resulting b64 image for any black pixels
+        try:
+            mimetype, signature_1 = decode_image_data_url(signature_1_b64)
+        except ValueError:
+            return jsonify({"error": "Signature 1 is invalid"}), 400
+        try:
+            _, signature_2 = decode_image_data_url(signature_2_b64)
+        except ValueError:
+            return jsonify({"error": "Signature 2 is invalid"}), 400
 
         waiver = Waiver(
             member_id=member.id,
@@ -97,9 +106,8 @@ def hike_waiver_page():
             print_name=name,
             is_minor=is_minor,
             age=age,
-            signature_1_b64=signature_1_b64,
-            signature_2_b64=signature_2_b64,
             signed_on=datetime.now(timezone.utc),
+            signatures=WaiverSignature(mimetype=mimetype, signature_1=signature_1, signature_2=signature_2),
         )
         db.session.add(waiver)
         db.session.commit()
@@ -107,6 +115,7 @@ def hike_waiver_page():
             f"hike:{hike.id}",
             "waiver_updated",
             {"signup_id": signup.id, "member_id": member.id},
+            patch={"users": [{"member_id": member.id, "has_waiver": True}]},
         )
 
         current_app.extensions["celery"].send_task("app.tasks.generate_waiver_pdf", args=[waiver.id])
@@ -1,39 +1,63 @@
-import io
+import logging
+import math
 import os
-import time
 import zipfile
-from datetime import timedelta
 import pymupdf
 from datetime import datetime, timezone
 from typing import List
+from celery import chord
+from celery.signals import worker_process_init
 from make_celery import celery_app
 from flask import current_app
+from sqlalchemy import and_, null, select
 from . import db
-from .lib import phases
-from .lib.email_connection import EmailConnection
-from .lib.realtime import publish_event
+from .lib import phase_schedule
+from .lib.email_connection import EmailConnection, SMTPPool
+from .lib.email_record import CAMPAIGN_EMAIL_TYPES, WAITLIST_BUMP_CAMPAIGN, populate_campaign_tasks
+from .lib.email_status import EmailStatusWriter, claim_batch, send_under_lease
+from .lib.realtime import publish_event, ThrottledPublisher
 from .models import EmailCampaign, EmailTask, Member, MagicLink, Trail, Signup, Hike, Waiver
-from .lib.model_utils import get_current_ay_start
-from .lib.email_templates import render_email_batch
+from .lib.email_templates import render_email_batch, precompile_email_templates
 from .lib.email_utils import get_personalization, EmailFile
-from .lib.pdftools import fill_signature, fill_text_rich
+from .lib.pdftools import waiver_widget_index
+from .lib.waiver_render import render_waivers, waiver_render_job, waiver_render_jobs
+from .lib.waiver_store import record_pdf_digests, store_pdf
 from zoneinfo import ZoneInfo
 
+@worker_process_init.connect
+def prewarm_worker_process(**kwargs):
+    """
+    Pay template cold-start costs when a worker process boots rather than in the first
+    task after a deploy: compile the email templates to bytecode and load the fillable
+    waiver PDF (bytes + widget index) into memory.
+    """
+    log = logging.getLogger(__name__)
+    try:
+        log.info("precompiled %s email templates", precompile_email_templates())
+    except Exception:
+        log.exception("email template pre-warm failed")
+    try:
+        waiver_widget_index()
+    except Exception:
+        log.exception("waiver PDF template pre-warm failed")
+
+
 @celery_app.task(name="app.tasks.start_email_campaign")
 def start_email_campaign(hike_id: int, waitlist=False) -> int:
     """
     The waitlist flag is available for hikes in the waiver phase only-- if set to True, will send waitlist emails to waitlisted signups instead of waivers.
     Create a new email campaign based on the provided hike's phase,
     clear & repopulate EmailTask with one row per member,
-    clear previous MagicLinks, and pre-generate a MagicLink for each member.
-    Finally, enqueue the Celery batch sender.
+    clear previous MagicLinks, and pre-generate a MagicLink for each member in bulk.
+    Finally, fan the campaign out to MAIL_CAMPAIGN_SHARDS batch senders.
     """
     # 0) Safety checks
     hike = Hike.query.get(hike_id)
     if hike.status != "active":
         raise RuntimeError("Can only start email campaigns for active hikes")
     email_type = hike.phase
-    if hike.email_campaign_completed:
+    # the waitlist campaign runs alongside the waiver campaign, so it doesn't care whether that one finished first
+    if hike.email_campaign_completed and not waitlist:
         raise RuntimeError(f"{email_type} phase email campaign already completed for this hike")
 
     # 1) Create campaign
@@ -45,68 +69,22 @@ def start_email_campaign(hike_id: int, waitlist=False) -> int:
     db.session.add(campaign)
     db.session.commit()
 
-    # 2) Clear prior magic links for this hike
-    MagicLink.query.filter_by(hike_id=hike_id).delete()
-    db.session.commit()
-
-    # 3) Populate tasks from all members
-
-    if email_type in ("voting", "signup"):
-        ay_start = get_current_ay_start()
-        members: List[Member] = Member.query.filter(
-            Member.joined_on >= ay_start,
-            Member.subscribed_to_mailing_list == True,
-        ).all()
-    else:
-        if waitlist:
-            # send waitlist email only to waitlisted hikers
-            members: List[Member] = (
-                Member.query
-                .join(Signup, Signup.member_id == Member.id)
-                .filter(
-                    Signup.hike_id == hike_id,
-                    Signup.status == "waitlisted",
-                    Member.subscribed_to_mailing_list == True,
-                )
-                .distinct()
-                .all()
-            )
-            if len(members) == 0:
-                return -1
-        else:
-            # send waivers only to confirmed hikers
-            members: List[Member] = (
-                Member.query
-                .join(Signup, Signup.member_id == Member.id)
-                .filter(
-                    Signup.hike_id == hike_id,
-                    Signup.status == "confirmed",
-                    Member.subscribed_to_mailing_list == True,
-                )
-                .distinct()
-                .all()
-            )
+    # 2) Clear prior magic links for this hike (the waitlist campaign mints none, and must
+    #    not wipe the links the waiver campaign just minted)
+    if not waitlist:
+        MagicLink.query.filter_by(hike_id=hike_id).delete()
+        db.session.commit()
 
-    tasks: List[EmailTask] = []
+    # 3) Populate tasks from the campaign's audience (one INSERT ... SELECT ... RETURNING member_id)
+    member_ids = populate_campaign_tasks(campaign)
+    num_tasks = len(member_ids)
+    if waitlist and num_tasks == 0:
+        return -1
 
-    for m in members:
-        to_email = getattr(m, "email", None)
-        if not to_email:
-            continue
-
-        tasks.append(
-            EmailTask(
-                campaign_id=campaign.id,
-                member_id=m.id,
-                status="pending",
-                attempts=0,
-                sent_at=None,
-            )
-        )
-
-    if tasks:
-        db.session.add_all(tasks)
-        db.session.commit()
+    # 4) Pre-mint every recipient's magic link in one bulk INSERT
+    if campaign.type in ("voting", "signup", "waiver"):
+        mlm = current_app.extensions["magic_link_manager"]
+        mlm.generate_many(member_ids, hike_id, campaign.type)
 
     publish_event(
         f"email-campaigns:hike:{hike_id}",
@@ -114,11 +92,54 @@ def start_email_campaign(hike_id: int, waitlist=False) -> int:
         {"campaign_id": campaign.id, "type": campaign.type},
     )
 
-    # 4) Kick off Celery
-    batch_send_emails.delay(campaign_id=campaign.id, hike_id=hike_id)
+    # 5) Kick off Celery
+    batch_size = int(current_app.config.get("MAIL_BATCH_SIZE", 50))
+    shards = min(int(current_app.config.get("MAIL_CAMPAIGN_SHARDS", 2)), math.ceil(num_tasks / batch_size))
+    dispatch_campaign_senders(campaign.id, hike_id, shards=shards)
     return campaign.id
 
 
+def dispatch_campaign_senders(campaign_id: int, hike_id: int, shards: int = 1, countdown: int = None):
+    """
+    Start `shards` batch_send_emails tasks that drain the campaign side by side, with
+    finalize_email_campaign as the chord callback once every one of them returns.
+    """
+    senders = [
+        batch_send_emails.s(campaign_id=campaign_id, hike_id=hike_id).set(countdown=countdown)
+        for _ in range(max(1, shards))
+    ]
+    return chord(senders)(finalize_email_campaign.s(campaign_id=campaign_id, hike_id=hike_id))
+
+
+@celery_app.task(name="app.tasks.dispatch_email_outbox")
+def dispatch_email_outbox(hike_id: int = None) -> List[int]:
+    """
+    Send the unclaimed outbox rows (see email_record.record_outbox) of one hike -- or, without a
+    hike_id, of every hike -- as a mini-campaign through the batch sender. Called once after each
+    committed waitlist bump, and periodically to pick up rows whose dispatch was lost.
+    Returns the ids of the campaigns that were dispatched.
+    """
+    query = (
+        db.session.query(EmailCampaign.id, EmailCampaign.hike_id)
+        .filter(EmailCampaign.type == WAITLIST_BUMP_CAMPAIGN)
+        .filter(
+            db.session.query(EmailTask.id)
+            .filter(EmailTask.campaign_id == EmailCampaign.id,
+                    EmailTask.status == "pending",
+                    EmailTask.claimed_at.is_(None))
+            .exists()
+        )
+    )
+    if hike_id is not None:
+        query = query.filter(EmailCampaign.hike_id == hike_id)
+
+    dispatched = []
+    for campaign_id, campaign_hike_id in query.all():
+        dispatch_campaign_senders(campaign_id, campaign_hike_id)
+        dispatched.append(campaign_id)
+    return dispatched
+
+
 @celery_app.task(
     name="app.tasks.batch_send_emails",
     acks_late=True,
@@ -126,86 +147,160 @@ def start_email_campaign(hike_id: int, waitlist=False) -> int:
 )
 def batch_send_emails(*, campaign_id: int, hike_id: int) -> dict:
     """
-    Process pending EmailTask rows for this campaign in batches.
-    Opens one SMTP connection per batch via EmailConnection.connect()
-    and personalizes each message using the pre-generated magic link.
-    Sends up to MAIL_BATCH_SIZE emails per batch, then pauses for MAIL_BATCH_PAUSE_SEC.
+    One shard of a campaign: claims and sends pending EmailTask rows in batches until none
+    are left unclaimed. Several shards can run at once (see dispatch_campaign_senders).
+    Each batch is read with one query joining the member, their pre-minted magic link
+    and their signup. Messages are personalized from that, then handed to an
+    SMTPPool that keeps MAIL_SMTP_POOL_SIZE authenticated sessions open for the whole
+    campaign and sends over them in parallel.
+    Claims up to MAIL_BATCH_SIZE emails per batch; pacing comes from the pool's shared,
+    adaptive SMTPRateLimiter.
     Retries up to MAIL_MAX_ATTEMPTS per recipient.
+    Each batch is claimed (attempts charged) up front and its outcomes written back in
+    one statement; progress events are coalesced to one per MAIL_PROGRESS_EVENT_SEC.
+    Never raises: a failed shard must still let the chord call finalize_email_campaign,
+    which re-dispatches whatever it left pending once the claim lease runs out.
     """
+    try:
+        return _send_campaign_shard(campaign_id, hike_id)
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception("batch_send_emails shard failed (campaign_id=%s)", campaign_id)
+        return {"campaign_id": campaign_id, "sent": 0, "failed": 0, "error": True}
+
+
+def _send_campaign_shard(campaign_id: int, hike_id: int) -> dict:
     cfg = current_app.config
     batch_size = int(cfg.get("MAIL_BATCH_SIZE", 50))
     max_attempts = int(cfg.get("MAIL_MAX_ATTEMPTS", 3))
-    batch_pause_sec = float(cfg.get("MAIL_BATCH_PAUSE_SEC", 0.0))
+    lease_sec = int(cfg.get("MAIL_CLAIM_LEASE_SEC", 600))
 
     camp = EmailCampaign.query.get(campaign_id)
-    email_type = camp.type
+    email_type = CAMPAIGN_EMAIL_TYPES.get(camp.type, camp.type)
     hike = Hike.query.get(hike_id)
 
     # modularize email template w/ static batch data
     subj, text_body_mod, html_body_mod, batch_text = render_email_batch(email_type, hike)
 
+    # newest magic link minted for the recipient by start_email_campaign (None for waitlist emails)
+    magic_token = (
+        select(MagicLink.token)
+        .where(
+            MagicLink.member_id == EmailTask.member_id,
+            MagicLink.hike_id == hike_id,
+            MagicLink.type == email_type,
+        )
+        .order_by(MagicLink.id.desc())
+        .limit(1)
+        .correlate(EmailTask)
+        .scalar_subquery()
+    )
+    if email_type != camp.type:
+        # outbox campaigns mint nothing up front; get_personalization mints a fresh link per recipient
+        magic_token = null()
+
     sent_total = failed_total = 0
     conn = EmailConnection()
+    statuses = EmailStatusWriter(max_attempts)
+    progress = ThrottledPublisher(float(cfg.get("MAIL_PROGRESS_EVENT_SEC", 1)))
+
+    with SMTPPool() as pool:
+        while True:
+            claimed = claim_batch(campaign_id, batch_size, max_attempts, lease_sec)
+            if not claimed:
+                break
+
+            batch = (
+                db.session.query(EmailTask, Member, magic_token, Signup)
+                .outerjoin(Member, Member.id == EmailTask.member_id)
+                .outerjoin(Signup, and_(Signup.member_id == EmailTask.member_id, Signup.hike_id == hike_id))
+                .filter(EmailTask.id.in_(claimed))
+                .order_by(EmailTask.id.asc())
+                .all()
+            )
 
-    while True:
-        batch: List[EmailTask] = (
-            EmailTask.query
-            .filter_by(campaign_id=campaign_id, status="pending")
-            .order_by(EmailTask.id.asc())
-            .limit(batch_size)
-            .all()
-        )
-        if not batch:
-            break
-
-        with conn.connect() as server:
-            for email_task in batch:
+            # DB work stays on this thread; only SMTP is parallel.
+            outbox = []
+            for email_task, member, token, signup in batch:
                 # derive per-recipient context
-                member = Member.query.get(email_task.member_id)
                 if not member:
-                    email_task.status = "failed"
-                    db.session.commit()
-                    break
+                    statuses.failed(email_task.id, final=True)
+                    failed_total += 1
+                    continue
 
                 to_email = getattr(member, "email", None)
 
                 # Render modules to personalized emails
-                personalization = get_personalization(email_type, hike, member)
+                personalization = get_personalization(email_type, hike, member, magic_token=token, signup=signup)
                 text_body = text_body_mod.email(personalization, batch_text)
                 html_body = html_body_mod.email(personalization, batch_text)
 
-                # send the email
-                result = conn.send(to_email, subj, text_body, html_body)
-                email_task.attempts += 1
+                outbox.append((email_task, member, conn.build_message(to_email, subj, text_body, html_body)))
 
+            # rate-limited, so this can outlast the claim; the lease is renewed while it runs
+            results = send_under_lease(pool, [(task.id, msg) for task, _, msg in outbox], lease_sec)
+
+            for (email_task, member, _), result in zip(outbox, results):
                 if result:
-                    email_task.status = "sent"
-                    email_task.sent_at = datetime.now(timezone.utc)
-                    db.session.commit()
+                    statuses.sent(email_task.id)
                     sent_total += 1
                 else:
-                    if email_task.attempts >= max_attempts:
-                        email_task.status = "failed"
-                    db.session.commit()
+                    statuses.failed(email_task.id)
                     failed_total += 1
-                    current_app.logger.exception(
+                    current_app.logger.error(
                         f"{email_type} email send failed for member_id=%s (attempt %s/%s)",
                         member.id, email_task.attempts, max_attempts
                     )
 
-                publish_event(f"campaign:{campaign_id}", "tasks_updated", {})
+            # one UPDATE ... FROM (VALUES ...) for the whole batch
+            statuses.flush()
+            if pool.auth_error is not None:
+                raise pool.auth_error  # every other session would be refused too
+
+            progress.publish(f"campaign:{campaign_id}", "tasks_updated", {})
+            progress.publish(
+                f"email-campaigns:hike:{hike_id}",
+                "campaign_progress",
+                {"campaign_id": campaign_id},
+            )
+
+    progress.flush()
+
+    return {"campaign_id": campaign_id, "sent": sent_total, "failed": failed_total}
 
-        publish_event(
-            f"email-campaigns:hike:{hike_id}",
-            "campaign_progress",
-            {"campaign_id": campaign_id},
-        )
 
-        if batch_pause_sec > 0:
-            time.sleep(batch_pause_sec)
+@celery_app.task(name="app.tasks.finalize_email_campaign")
+def finalize_email_campaign(shard_results, *, campaign_id: int, hike_id: int) -> dict:
+    """
+    Chord callback run once every batch_send_emails shard of a campaign has returned.
+    Marks the campaign (and the hike's phase campaign) completed, unless rows are still
+    pending under a lease held by a shard that died or errored -- then one more shard is scheduled
+    for when that lease expires, and it calls back here again. Only the campaign of the
+    hike's current phase sets its flag; the waitlist and outbox campaigns leave it alone.
+    """
+    sent_total = sum(r["sent"] for r in shard_results or [] if r)
+    failed_total = sum(r["failed"] for r in shard_results or [] if r)
+
+    # row lock shared with email_record.record_outbox, which appends rows to outbox campaigns
+    camp = (
+        db.session.query(EmailCampaign)
+        .filter_by(id=campaign_id)
+        .with_for_update()
+        .populate_existing()
+        .one()
+    )
+    remaining = EmailTask.query.filter_by(campaign_id=campaign_id, status="pending").count()
+    if remaining:
+        db.session.commit()  # release the lock
+        dispatch_campaign_senders(
+            campaign_id, hike_id, countdown=int(current_app.config.get("MAIL_CLAIM_LEASE_SEC", 600))
+        )
+        return {"campaign_id": campaign_id, "sent": sent_total, "failed": failed_total, "pending": remaining}
 
+    hike = Hike.query.get(hike_id)
     camp.date_completed = datetime.now(timezone.utc)
-    hike.email_campaign_completed = True
+    if camp.type == hike.phase:
+        hike.email_campaign_completed = True
     db.session.commit()
 
     publish_event(f"campaign:{campaign_id}", "tasks_updated", {})
@@ -291,65 +386,11 @@ def generate_waiver_pdf(waiver_id, email_user=True):
 
     trail = Trail.query.get(hike.trail_id)
 
-    doc = pymupdf.open("app/templates/waiver_fillable.pdf")
-    page = doc.load_page(0)  # single-page document
-
-    # Always will be filled:
-    fill_text_rich(page,
-                   "fname",
-                   waiver.print_name,
-                   font_size=16
-                   )
-    fill_text_rich(page,
-                   "event_description",
-                   f"PARTICIPANT SPORTING EVENT DESCRIPTION: <b>{trail.name.title()}</b>"
-                   )
-    fill_text_rich(page,
-                   "event_date",
-                   f"SPORTING EVENT DATE: <b>{hike.get_localized_time('hike_date').strftime('%A %B %d, %Y')}</b>"
-                   )
-
-    # localize waiver-signed dates to server timezone (probably America/Los_Angeles).
     tz = ZoneInfo(current_app.config["SERVER_TIMEZONE"])
-    signed_on_localized = waiver.signed_on.replace(tzinfo=ZoneInfo("UTC")).astimezone(tz)
-
-    if waiver.is_minor:
-        fill_signature(doc, "sig1_minor", waiver.signature_1_b64.split(",")[1])
-        fill_signature(doc, "sig2_minor", waiver.signature_2_b64.split(",")[1])
-        fill_text_rich(page,
-                       "date1_minor",
-                       signed_on_localized.strftime("%m/%d/%Y"),
-                       font_size=12
-                       )
-        fill_text_rich(page,
-                       "date2_minor",
-                       signed_on_localized.strftime("%m/%d/%Y"),
-                       font_size=12
-                       )
-        fill_text_rich(page,
-                       "age",
-                       str(waiver.age)
-                       )
-    else:
-        fill_signature(doc, "sig1_user", waiver.signature_1_b64.split(",")[1])
-        fill_signature(doc, "sig2_user", waiver.signature_2_b64.split(",")[1])
-        fill_text_rich(page,
-                       "date1_user",
-                       signed_on_localized.strftime("%m/%d/%Y"),
-                       font_size=12
-                       )
-        fill_text_rich(page,
-                       "date2_user",
-                       signed_on_localized.strftime("%m/%d/%Y"),
-                       font_size=12
-                       )
-
-    # flatten, save, and commit pdf to DB
-    doc.bake()
-
-    pdf_bytes = doc.write(deflate=True, clean=True, garbage=4)
-
-    doc.close()
+    job = waiver_render_job(waiver, hike, trail, tz, member.name)
+    _, pdf_bytes = next(render_waivers([job]))
+    if not job.pdf_path:
+        record_pdf_digests({waiver.id: store_pdf(pdf_bytes)})
 
     # Send email, unless send_email is false
     if not send_email:
@@ -370,97 +411,139 @@ def generate_waiver_pdf(waiver_id, email_user=True):
 
 @celery_app.task(name="app.tasks.export_member_waivers", bind=True)
 def export_member_waivers(self, member_id: int):
-    """Generate filled waiver PDFs for all of a member's signed waivers and bundle into a zip."""
+    """
+    Generate filled waiver PDFs for all of a member's signed waivers and bundle into a zip.
+    PDFs are rendered in WAIVER_EXPORT_PROCESSES worker processes and streamed straight
+    into the zip on disk; progress is reported as PROGRESS task state ({done, total}).
+    """
     member = Member.query.get(member_id)
     if not member:
         raise ValueError("invalid member_id")
 
-    waivers = (
-        Waiver.query
-        .filter_by(member_id=member_id)
+    rows = (
+        db.session.query(Waiver, Hike, Trail)
+        .join(Hike, Hike.id == Waiver.hike_id)
+        .join(Trail, Trail.id == Hike.trail_id)
+        .filter(Waiver.member_id == member_id)
         .order_by(Waiver.signed_on.desc())
-        .all()
     )
-
-    if not waivers:
+    total = rows.count()
+    if not total:
         raise ValueError("member has no signed waivers")
 
     tz = ZoneInfo(current_app.config["SERVER_TIMEZONE"])
-    buf = io.BytesIO()
-
-    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
-        for waiver in waivers:
-            hike = Hike.query.get(waiver.hike_id)
-            if not hike:
-                continue
-            trail = Trail.query.get(hike.trail_id)
-            if not trail:
-                continue
-
-            doc = pymupdf.open("app/templates/waiver_fillable.pdf")
-            page = doc.load_page(0)
-
-            fill_text_rich(page, "fname", waiver.print_name, font_size=16)
-            fill_text_rich(
-                page, "event_description",
-                f"PARTICIPANT SPORTING EVENT DESCRIPTION: <b>{trail.name.title()}</b>",
-            )
-            fill_text_rich(
-                page, "event_date",
-                f"SPORTING EVENT DATE: <b>{hike.get_localized_time('hike_date').strftime('%A %B %d, %Y')}</b>",
-            )
+    jobs = waiver_render_jobs(
+        ((waiver, hike, trail, member.name) for waiver, hike, trail in rows.yield_per(50)), tz
+    )
+    out_path = write_waiver_export(self, jobs, total)
+    return {"status": "done", "path": out_path}
+
 
-            signed_on_localized = waiver.signed_on.replace(tzinfo=ZoneInfo("UTC")).astimezone(tz)
-
-            if waiver.is_minor:
-                fill_signature(doc, "sig1_minor", waiver.signature_1_b64.split(",")[1])
-                fill_signature(doc, "sig2_minor", waiver.signature_2_b64.split(",")[1])
-                fill_text_rich(page, "date1_minor", signed_on_localized.strftime("%m/%d/%Y"), font_size=12)
-                fill_text_rich(page, "date2_minor", signed_on_localized.strftime("%m/%d/%Y"), font_size=12)
-                fill_text_rich(page, "age", str(waiver.age))
-            else:
-                fill_signature(doc, "sig1_user", waiver.signature_1_b64.split(",")[1])
-                fill_signature(doc, "sig2_user", waiver.signature_2_b64.split(",")[1])
-                fill_text_rich(page, "date1_user", signed_on_localized.strftime("%m/%d/%Y"), font_size=12)
-                fill_text_rich(page, "date2_user", signed_on_localized.strftime("%m/%d/%Y"), font_size=12)
-
-            doc.bake()
-            pdf_bytes = doc.write(deflate=True, clean=True, garbage=4)
-            doc.close()
-
-            hike_date_str = hike.get_localized_time("hike_date").strftime("%m-%d-%Y")
-            filename = f"{member.name.title()} - {trail.name.title()} {hike_date_str}.pdf"
-            zf.writestr(filename, pdf_bytes)
-
-    # Write zip to exports directory
-    os.makedirs(current_app.config["WAIVER_EXPORTS_DIR"], exist_ok=True)
-    task_id = self.request.id
-    out_path = os.path.join(current_app.config["WAIVER_EXPORTS_DIR"], f"{task_id}.zip")
-    with open(out_path, "wb") as f:
-        f.write(buf.getvalue())
+@celery_app.task(name="app.tasks.export_hike_waivers", bind=True)
+def export_hike_waivers(self, hike_id: int, merged: bool = False):
+    """
+    Generate filled waiver PDFs for every signed waiver of a hike, either bundled into a
+    zip (one PDF per member) or, if `merged`, as a single multi-page PDF in name order.
+    Uses the same output location, and so the same status/download flow, as
+    export_member_waivers.
+    """
+    hike = Hike.query.get(hike_id)
+    if not hike:
+        raise ValueError("invalid hike_id")
+    trail = Trail.query.get(hike.trail_id)
+    if not trail:
+        raise ValueError("hike has no trail")
+
+    rows = (
+        db.session.query(Waiver, Member.name)
+        .join(Member, Member.id == Waiver.member_id)
+        .filter(Waiver.hike_id == hike_id)
+        .order_by(Member.name.asc(), Waiver.id.asc())
+    )
+    total = rows.count()
+    if not total:
+        raise ValueError("hike has no signed waivers")
 
+    tz = ZoneInfo(current_app.config["SERVER_TIMEZONE"])
+    jobs = waiver_render_jobs(
+        ((waiver, hike, trail, member_name) for waiver, member_name in rows.yield_per(50)), tz
+    )
+    out_path = write_waiver_export(self, jobs, total, fmt="pdf" if merged else "zip")
     return {"status": "done", "path": out_path}
 
 
+def write_waiver_export(task, jobs, total: int, fmt: str = "zip") -> str:
+    """
+    Render `jobs` into WAIVER_EXPORTS_DIR/<task id>.<fmt>: "zip" streams each PDF into the
+    archive as it is rendered, "pdf" appends every page to one merged document. The file
+    is written under a temporary name and renamed when complete, because the status
+    endpoint treats an existing export file as finished. Waivers that had to be rendered
+    are saved to the waiver store so the next export can copy them.
+    """
+    exports_dir = current_app.config["WAIVER_EXPORTS_DIR"]
+    os.makedirs(exports_dir, exist_ok=True)
+    out_path = os.path.join(exports_dir, f"{task.request.id}.{fmt}")
+    part_path = f"{out_path}.part"
+
+    processes = current_app.config["WAIVER_EXPORT_PROCESSES"]
+    if total <= processes:
+        processes = 1  # not worth starting a pool for a handful of PDFs
+    digests: dict[int, str] = {}
+
+    def rendered():
+        for job, pdf_bytes in render_waivers(jobs, processes=processes):
+            if not job.pdf_path:
+                digests[job.waiver_id] = store_pdf(pdf_bytes)
+            yield job, pdf_bytes
+
+    def progress(done):
+        task.update_state(state="PROGRESS", meta={"done": done, "total": total})
+
+    try:
+        if fmt == "zip":
+            with zipfile.ZipFile(part_path, "w", zipfile.ZIP_DEFLATED) as zf:
+                for done, (job, pdf_bytes) in enumerate(rendered(), start=1):
+                    zf.writestr(job.filename, pdf_bytes)
+                    progress(done)
+        else:
+            # a PDF can't be streamed like a zip; only the merged document is held in memory
+            with pymupdf.open() as merged:
+                for done, (job, pdf_bytes) in enumerate(rendered(), start=1):
+                    with pymupdf.open(stream=pdf_bytes, filetype="pdf") as src:
+                        merged.insert_pdf(src)
+                    progress(done)
+                merged.save(part_path, deflate=True, garbage=4)
+        os.replace(part_path, out_path)
+    except BaseException:
+        try:
+            os.remove(part_path)
+        except OSError:
+            pass
+        raise
+
+    record_pdf_digests(digests)
+    return out_path
+
+
+@celery_app.task(name="app.tasks.advance_hike_phase")
+def advance_hike_phase(hike_id: int, phase: str, token: str = None) -> bool:
+    """ETA task scheduled by phase_schedule.schedule_phase_transition; see phase_schedule.advance_phase."""
+    return phase_schedule.advance_phase(hike_id, phase, token)
+
+
 @celery_app.task(name="app.tasks.check_and_update_phase")
 def check_and_update_phase():
+    """
+    Beat safety net for the ETA-scheduled phase transitions: advances the active hike if its
+    transition is overdue (its message was lost), and schedules one if none is on record.
+    """
     ah = Hike.query.filter_by(status="active").first()
     if not ah: return
 
-    now = datetime.now()
-
-    match ah.phase:
-        case "voting":
-            if now >= ah.signup_date:
-                phases.initiate_signup_phase(ah.id)
-                start_email_campaign(ah.id)
-
-        case "signup":
-            if now >= ah.waiver_date:
-                phases.initiate_waiver_phase(ah.id)
-                start_email_campaign(ah.id)
-                start_email_campaign(ah.id, waitlist=True)
-
-        case "waiver":
-            if now >= ah.hike_date + timedelta(hours=current_app.config.get("HIKE_RESET_TIME_HR")):
-                phases.complete_hike(ah.id)
+    due = phase_schedule.phase_due_at(ah)
+    if due is None:
+        return
+    if datetime.now(timezone.utc) >= due:
+        phase_schedule.advance_phase(ah.id, ah.phase)
+    elif not phase_schedule.is_scheduled(ah.id):
+        phase_schedule.schedule_phase_transition(ah)
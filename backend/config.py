@@ -38,6 +38,9 @@ class Config:
     STATIC_URL_PATH = '/assets'
 
     WAIVER_EXPORTS_DIR = os.path.join(BASE_DIR, 'exports')
+    WAIVER_STORE_DIR = os.getenv("WAIVER_STORE_DIR", os.path.join(BASE_DIR, 'waiver_store'))
+    # worker processes used to render PDFs for a waiver export (1 = render in the task itself)
+    WAIVER_EXPORT_PROCESSES = int(os.getenv("WAIVER_EXPORT_PROCESSES", min(4, os.cpu_count() or 1)))
     UPLOAD_FOLDER = os.path.join(BASE_DIR, 'static', 'uploads')
     ALLOWED_UPLOAD_EXTENSIONS = {'png'}
 
@@ -53,7 +56,20 @@ class Config:
     MAIL_DISPLAY_FROM = os.getenv("MAIL_DISPLAY_FROM")
     MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", 100))
     MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", 3))
-    MAIL_BATCH_PAUSE_SEC = int(os.getenv("MAIL_BATCH_PAUSE_SEC", 5))
+    # shared (all workers) adaptive send rate: starts at the max, halves on 4xx deferrals, ramps back up
+    MAIL_RATE_MAX_PER_SEC = float(os.getenv("MAIL_RATE_MAX_PER_SEC", 10))
+    MAIL_RATE_MIN_PER_SEC = float(os.getenv("MAIL_RATE_MIN_PER_SEC", 0.5))
+    MAIL_RATE_BURST = int(os.getenv("MAIL_RATE_BURST", 10))
+    # number of SMTP sessions kept open (and sending in parallel) per campaign worker
+    MAIL_SMTP_POOL_SIZE = int(os.getenv("MAIL_SMTP_POOL_SIZE", 4))
+    # messages sent over one SMTP session before it is closed and re-opened
+    MAIL_SMTP_MAX_MESSAGES_PER_CONN = int(os.getenv("MAIL_SMTP_MAX_MESSAGES_PER_CONN", 100))
+    # number of batch_send_emails tasks that drain one campaign in parallel
+    MAIL_CAMPAIGN_SHARDS = int(os.getenv("MAIL_CAMPAIGN_SHARDS", 2))
+    # seconds a claimed EmailTask stays reserved for its sender before another may retry it
+    MAIL_CLAIM_LEASE_SEC = int(os.getenv("MAIL_CLAIM_LEASE_SEC", 600))
+    # minimum seconds between campaign progress events published to dashboards
+    MAIL_PROGRESS_EVENT_SEC = float(os.getenv("MAIL_PROGRESS_EVENT_SEC", 1))
 
     DIFFICULTY_INDEX = {
         0: "Easy",
@@ -62,6 +78,12 @@ class Config:
         3: "Very Difficult"
     }
 
+    # passenger selection fairness (see app/lib/fairness.py): how many past hikes of the academic year to
+    # look back on, the scoring strategy ('recency' or 'weighted'), and per-hike weights for 'weighted'
+    SELECTION_LOOKBACK_HIKES = int(os.getenv("SELECTION_LOOKBACK_HIKES", 2))
+    SELECTION_STRATEGY = os.getenv("SELECTION_STRATEGY", "recency")
+    SELECTION_WEIGHTS = [float(w) for w in os.getenv("SELECTION_WEIGHTS", "").split(",") if w.strip()]
+
     ACADEMIC_YEAR_START_MONTH = 8  # August
     ACADEMIC_YEAR_START_DAY = 1    # 1st, midnight UTC
 
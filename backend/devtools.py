@@ -19,6 +19,7 @@ from app.models import (
     Trail,
     Signup,
     Waiver,
+    WaiverSignature,
     Vehicle,
     Vote,
     Hike,
@@ -36,6 +37,7 @@ def clear_db():
         MagicLink,
         Signup,
         Vote,
+        WaiverSignature,
         Waiver,
         Vehicle,
         Hike,
@@ -474,8 +476,7 @@ def seed_waiver():
             signed_on=datetime.now(timezone.utc) - timedelta(days=random.randint(0, 2)),
             print_name="",
             is_minor=False,
-            signature_1_b64="",
-            signature_2_b64=""
+            signatures=WaiverSignature(signature_1=b"", signature_2=b""),
         )
         for mid in waiver_members
     ]
@@ -5,8 +5,13 @@ flask_app = create_app()
 celery_app = flask_app.extensions["celery"]
 celery_app.conf.imports = "app.tasks"
 celery_app.conf.beat_schedule = {
-    'update_phase_every_min': {
+    # phase transitions are ETA tasks (see app/lib/phase_schedule.py); this only catches lost ones
+    'check_phase_every_10_min': {
         'task': 'app.tasks.check_and_update_phase',
-        'schedule': crontab()
+        'schedule': crontab(minute='*/10')
+    },
+    'dispatch_email_outbox_every_5_min': {
+        'task': 'app.tasks.dispatch_email_outbox',
+        'schedule': crontab(minute='*/5')
     }
 }
\ No newline at end of file
@@ -0,0 +1,28 @@
+"""add claimed_at to email_tasks
+
+Revision ID: 3f6b8e2d1a90
+Revises: d8f1a2b3c4e5
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f6b8e2d1a90'
+down_revision = 'd8f1a2b3c4e5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('email_tasks', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('claimed_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_email_tasks_campaign_id_status', ['campaign_id', 'status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('email_tasks', schema=None) as batch_op:
+        batch_op.drop_index('ix_email_tasks_campaign_id_status')
+        batch_op.drop_column('claimed_at')
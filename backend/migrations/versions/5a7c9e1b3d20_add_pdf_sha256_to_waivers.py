@@ -0,0 +1,26 @@
+"""add pdf_sha256 to waivers
+
+Revision ID: 5a7c9e1b3d20
+Revises: 3f6b8e2d1a90
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a7c9e1b3d20'
+down_revision = '3f6b8e2d1a90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('waivers', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('pdf_sha256', sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('waivers', schema=None) as batch_op:
+        batch_op.drop_column('pdf_sha256')
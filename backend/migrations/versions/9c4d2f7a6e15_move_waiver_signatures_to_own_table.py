@@ -0,0 +1,108 @@
+"""move waiver signatures to their own table as binary
+
+Revision ID: 9c4d2f7a6e15
+Revises: 5a7c9e1b3d20
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+import base64
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c4d2f7a6e15'
+down_revision = '5a7c9e1b3d20'
+branch_labels = None
+depends_on = None
+
+
+def _split_data_url(value):
+    """'data:image/png;base64,AAAA' -> ('image/png', b'...'); raw base64 is taken as png."""
+    mimetype = 'image/png'
+    if value.lower().startswith('data:') and ',' in value:
+        header, value = value.split(',', 1)
+        mimetype = header[5:].split(';', 1)[0] or mimetype
+    return mimetype, base64.b64decode(value)
+
+
+def upgrade():
+    op.create_table(
+        'waiver_signatures',
+        sa.Column('waiver_id', sa.Integer(), nullable=False),
+        sa.Column('mimetype', sa.String(length=50), nullable=False),
+        sa.Column('signature_1', sa.LargeBinary(), nullable=False),
+        sa.Column('signature_2', sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(['waiver_id'], ['waivers.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('waiver_id'),
+    )
+
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        # decode every data URL server-side in one statement
+        op.execute("""
+            INSERT INTO waiver_signatures (waiver_id, mimetype, signature_1, signature_2)
+            SELECT id,
+                   CASE WHEN signature_1_b64 LIKE 'data:%,%'
+                        THEN COALESCE(NULLIF(split_part(split_part(substr(signature_1_b64, 6), ',', 1), ';', 1), ''),
+                                      'image/png')
+                        ELSE 'image/png' END,
+                   decode(CASE WHEN signature_1_b64 LIKE 'data:%,%'
+                               THEN split_part(signature_1_b64, ',', 2) ELSE signature_1_b64 END, 'base64'),
+                   decode(CASE WHEN signature_2_b64 LIKE 'data:%,%'
+                               THEN split_part(signature_2_b64, ',', 2) ELSE signature_2_b64 END, 'base64')
+            FROM waivers
+        """)
+    else:
+        waivers = sa.table('waivers', sa.column('id'), sa.column('signature_1_b64'), sa.column('signature_2_b64'))
+        signatures = sa.table('waiver_signatures', sa.column('waiver_id'), sa.column('mimetype'),
+                              sa.column('signature_1'), sa.column('signature_2'))
+        rows = bind.execute(sa.select(waivers.c.id, waivers.c.signature_1_b64, waivers.c.signature_2_b64))
+        for batch in iter(lambda: rows.fetchmany(500), []):
+            values = []
+            for waiver_id, sig1, sig2 in batch:
+                mimetype, sig1_bytes = _split_data_url(sig1)
+                values.append({"waiver_id": waiver_id, "mimetype": mimetype,
+                               "signature_1": sig1_bytes, "signature_2": _split_data_url(sig2)[1]})
+            op.bulk_insert(signatures, values)
+
+    with op.batch_alter_table('waivers', schema=None) as batch_op:
+        batch_op.drop_column('signature_1_b64')
+        batch_op.drop_column('signature_2_b64')
+
+
+def downgrade():
+    with op.batch_alter_table('waivers', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('signature_1_b64', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('signature_2_b64', sa.Text(), nullable=True))
+
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute(r"""
+            UPDATE waivers w
+            SET signature_1_b64 = 'data:' || s.mimetype || ';base64,' || replace(encode(s.signature_1, 'base64'), E'\n', ''),
+                signature_2_b64 = 'data:' || s.mimetype || ';base64,' || replace(encode(s.signature_2, 'base64'), E'\n', '')
+            FROM waiver_signatures s
+            WHERE s.waiver_id = w.id
+        """)
+    else:
+        waivers = sa.table('waivers', sa.column('id'), sa.column('signature_1_b64'), sa.column('signature_2_b64'))
+        rows = bind.execute(sa.text(
+            "SELECT waiver_id, mimetype, signature_1, signature_2 FROM waiver_signatures"
+        )).fetchall()
+        for waiver_id, mimetype, sig1, sig2 in rows:
+            prefix = f"data:{mimetype};base64,"
+            bind.execute(
+                waivers.update().where(waivers.c.id == waiver_id).values(
+                    signature_1_b64=prefix + base64.b64encode(sig1).decode(),
+                    signature_2_b64=prefix + base64.b64encode(sig2).decode(),
+                )
+            )
+    op.execute("UPDATE waivers SET signature_1_b64 = '', signature_2_b64 = '' WHERE signature_1_b64 IS NULL")
+
+    with op.batch_alter_table('waivers', schema=None) as batch_op:
+        batch_op.alter_column('signature_1_b64', nullable=False)
+        batch_op.alter_column('signature_2_b64', nullable=False)
+
+    op.drop_table('waiver_signatures')
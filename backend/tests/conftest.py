@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+for key, value in {"DUMMY_EMAIL_MODE": "true", "JWT_SECRET_KEY": "test-secret", "MAIL_FROM": "club@example.org"}.items():
+    os.environ.setdefault(key, value)
+
+fakeredis = pytest.importorskip("fakeredis")
+
+import config  # noqa: E402
+from app import create_app  # noqa: E402
+from app.extensions import db  # noqa: E402
+from app.lib import realtime  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(config.Config, "SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setattr(realtime, "_redis", fakeredis.FakeRedis(decode_responses=True))
+    app = create_app()
+    app.config["TESTING"] = True
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
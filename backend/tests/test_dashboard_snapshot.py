@@ -0,0 +1,57 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+from app.extensions import db
+from app.lib import realtime
+from app.models import AdminUser, Hike, Member, Trail
+from app.routes.auth import _create_access_token
+
+
+def _seed_signup_hike():
+    now = datetime.utcnow()
+    trail = Trail(name="old name", location="Irvine", length_mi=3.0, estimated_time_hr=2.0,
+                  required_water_liters=1.0, difficulty=1, alltrails_url="https://example.org/old")
+    db.session.add(trail)
+    db.session.flush()
+    hike = Hike(status="active", phase="signup", trail_id=trail.id,
+                signup_date=now - timedelta(days=1), waiver_date=now + timedelta(days=1),
+                hike_date=now + timedelta(days=2))
+    member = Member(name="Officer", email="officer@example.org", joined_on=datetime.now(timezone.utc))
+    db.session.add_all([hike, member])
+    db.session.flush()
+    admin = AdminUser(email=member.email, member_id=member.id)
+    db.session.add(admin)
+    db.session.commit()
+    return trail, {"Authorization": f"Bearer {_create_access_token(admin)}"}
+
+
+def test_trail_edit_invalidates_upcoming_snapshot(app):
+    trail, auth = _seed_signup_hike()
+    client = app.test_client()
+
+    first = client.get("/api/admin/upcoming", headers=auth)
+    assert first.status_code == 200
+    assert first.get_json()["trail_name"] == "old name"
+
+    resp = client.put(f"/api/admin/trails/{trail.id}", headers=auth,
+                      json={"name": "new name", "alltrails_url": "https://example.org/new"})
+    assert resp.status_code == 200
+
+    # the old ETag no longer matches, and the rebuilt payload carries the edit
+    second = client.get("/api/admin/upcoming", headers={**auth, "If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 200
+    assert second.get_json()["trail_name"] == "new name"
+    assert second.get_json()["trail_alltrails_url"] == "https://example.org/new"
+
+
+def test_lost_version_key_does_not_revive_old_etags(app):
+    _, auth = _seed_signup_hike()
+    client = app.test_client()
+    first = client.get("/api/admin/upcoming", headers=auth)
+
+    # Redis restarted / evicted the counter: the dashboard's ETag must not match again
+    realtime._get_redis().flushall()
+    time.sleep(0.01)  # the new seed is a later millisecond timestamp
+    second = client.get("/api/admin/upcoming", headers={**auth, "If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 200
+    assert second.headers["ETag"] != first.headers["ETag"]
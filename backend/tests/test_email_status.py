@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta, timezone
+
+from app.extensions import db
+from app.lib import email_status
+from app.lib.email_status import claim_batch, send_under_lease
+from app.models import EmailCampaign, EmailTask, Hike, Member
+
+LEASE_SEC = 600
+MAX_ATTEMPTS = 3
+
+
+def _seed_campaign(n_tasks):
+    now = datetime.utcnow()
+    hike = Hike(status="active", phase="voting", signup_date=now, waiver_date=now, hike_date=now)
+    members = [Member(name=f"M{i}", email=f"m{i}@example.org", joined_on=datetime.now(timezone.utc))
+               for i in range(n_tasks)]
+    db.session.add_all([hike, *members])
+    db.session.flush()
+    campaign = EmailCampaign(hike_id=hike.id, type="voting")
+    db.session.add(campaign)
+    db.session.flush()
+    db.session.add_all([EmailTask(campaign_id=campaign.id, member_id=m.id) for m in members])
+    db.session.commit()
+    return campaign.id
+
+
+def test_slow_batch_keeps_its_rows_claimed(app, monkeypatch):
+    campaign_id = _seed_campaign(6)
+    claimed = claim_batch(campaign_id, 6, MAX_ATTEMPTS, LEASE_SEC)
+    assert len(claimed) == 6
+
+    clock = [0.0]
+    monkeypatch.setattr(email_status.time, "monotonic", lambda: clock[0])
+
+    class SlowPool:
+        size = 1  # two messages per chunk, three chunks
+
+        def send_many(self, messages):
+            # another sender must not be able to take any row of the batch over
+            assert claim_batch(campaign_id, 6, MAX_ATTEMPTS, LEASE_SEC) == []
+            # each chunk takes half the lease (the rate limiter is throttled right down)
+            clock[0] += LEASE_SEC / 2
+            for task in EmailTask.query.filter(EmailTask.claimed_at.isnot(None)):
+                task.claimed_at -= timedelta(seconds=LEASE_SEC / 2)
+            db.session.commit()
+            return [True] * len(messages)
+
+    results = send_under_lease(SlowPool(), [(task_id, object()) for task_id in claimed], LEASE_SEC)
+    assert results == [True] * 6
+    assert claim_batch(campaign_id, 6, MAX_ATTEMPTS, LEASE_SEC) == []
+
+
+def test_abandoned_claim_expires(app):
+    campaign_id = _seed_campaign(2)
+    claimed = claim_batch(campaign_id, 2, MAX_ATTEMPTS, LEASE_SEC)
+    for task in EmailTask.query.all():
+        task.claimed_at -= timedelta(seconds=LEASE_SEC + 1)
+    db.session.commit()
+
+    assert claim_batch(campaign_id, 2, MAX_ATTEMPTS, LEASE_SEC) == claimed
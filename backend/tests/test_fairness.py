@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta, timezone
+
+from app.extensions import db
+from app.lib import selection_algorithm
+from app.lib.fairness import get_scorer, recency_score, weighted_scorer
+from app.lib.model_utils import get_current_ay_start
+from app.models import Hike, Member, Signup, Vehicle
+
+# attendance bitmaps over the last two hikes: bit 0 is the most recent one
+MISSED_BOTH, ATTENDED_OLDER, ATTENDED_LAST, ATTENDED_BOTH = 0b00, 0b10, 0b01, 0b11
+
+
+def test_recency_with_two_hikes_is_the_original_rule():
+    ranked = sorted([ATTENDED_LAST, ATTENDED_BOTH, ATTENDED_OLDER, MISSED_BOTH], key=lambda b: recency_score(b, 2))
+    assert ranked == [MISSED_BOTH, ATTENDED_OLDER, ATTENDED_LAST, ATTENDED_BOTH]
+    # only the most recent attendance counts
+    assert recency_score(ATTENDED_LAST, 2) == recency_score(ATTENDED_BOTH, 2)
+
+
+def test_weighted_sinks_frequent_attendees():
+    score = weighted_scorer()
+    assert score(MISSED_BOTH, 2) < score(ATTENDED_OLDER, 2) < score(ATTENDED_LAST, 2) < score(ATTENDED_BOTH, 2)
+    # hikes beyond the lookback are ignored
+    assert score(0b100, 2) == score(MISSED_BOTH, 2)
+
+
+def test_get_scorer_uses_config(app):
+    app.config["SELECTION_STRATEGY"] = "weighted"
+    app.config["SELECTION_WEIGHTS"] = [1.0]
+    assert get_scorer()(ATTENDED_BOTH, 2) == 2.0  # the last weight is reused for older hikes
+
+
+def _hike(status, hike_date):
+    return Hike(status=status, phase="signup" if status == "active" else None, hike_date=hike_date,
+                signup_date=hike_date - timedelta(days=2), waiver_date=hike_date - timedelta(days=1))
+
+
+def test_selection_priority_order(app):
+    ay_start = get_current_ay_start().replace(tzinfo=None)
+    older = _hike("past", ay_start + timedelta(days=1))
+    last = _hike("past", ay_start + timedelta(days=2))
+    current = _hike("active", max(datetime.utcnow(), ay_start + timedelta(days=3)))
+    names = ["driver", "early_missed_both", "attended_older", "attended_both", "attended_last", "late_missed_both"]
+    members = {name: Member(name=name, email=f"{name}@example.org", joined_on=datetime.now(timezone.utc))
+               for name in names}
+    db.session.add_all([older, last, current, *members.values()])
+    db.session.flush()
+
+    vehicle = Vehicle(member_id=members["driver"].id, year=2020, make="Make", model="Model", passenger_seats=2)
+    db.session.add(vehicle)
+    db.session.flush()
+    for hike, attendees in ((older, ["attended_older", "attended_both"]),
+                            (last, ["attended_last", "attended_both"])):
+        db.session.add_all([Signup(member_id=members[n].id, hike_id=hike.id, transport_type="passenger",
+                                   food_interest=False, status="confirmed") for n in attendees])
+
+    # signup order for the current hike: `names` order, one minute apart
+    signups = {}
+    for i, name in enumerate(names):
+        signups[name] = Signup(member_id=members[name].id, hike_id=current.id, food_interest=False,
+                               transport_type="driver" if name == "driver" else "passenger",
+                               vehicle_id=vehicle.id if name == "driver" else None,
+                               signup_date=datetime(2000, 1, 1) + timedelta(minutes=i))
+    db.session.add_all(signups.values())
+    db.session.commit()
+
+    confirmed, waitlisted = selection_algorithm.run(current.id)
+
+    by_id = {s.id: name for name, s in signups.items()}
+    # missed both first, earlier signup winning the tie; then missed only the last hike;
+    # then attended the last hike, where attending the older one too doesn't matter and
+    # signup order decides again
+    assert [by_id[i] for i in confirmed] == ["driver", "early_missed_both", "late_missed_both"]
+    assert [by_id[i] for i in waitlisted] == ["attended_older", "attended_both", "attended_last"]
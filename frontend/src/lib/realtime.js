@@ -10,9 +10,16 @@
 // Behavior:
 //   - Opens a fetch-event-source connection with the user's JWT.
 //   - Auto-reconnects with exponential backoff (1s → 15s).
-//   - Pauses on document visibility=hidden, resumes (and refires every
-//     handler once with null for backfill) on visible.
+//   - Pauses on document visibility=hidden, resumes on visible.
+//   - Resumes where it left off: every reconnect sends the last event id, and
+//     the server replays only what was missed. If that is no longer possible
+//     it sends `resync`, and every handler is refired once with null so
+//     consumers refetch (backfill).
 //   - Coalesces bursts: each handler is debounced 250ms.
+//   - Delta mode (opt-in): a handler given as { fn, patch } has `patch(delta, data)`
+//     called right away, undebounced, for events that carry a patch; `fn` still
+//     handles events without one. Every event has a per-topic `seq`; when one
+//     is skipped (missed while reconnecting, say) every handler is backfilled.
 //   - On 401, refreshes the access token via useAuth and reconnects.
 //   - Cleans up on component unmount.
 
@@ -31,14 +38,20 @@ export function useRealtime(topicsRef, handlers) {
   let backoff = INITIAL_BACKOFF_MS
   let reopenTimer = null
   let visibilityHandler = null
+  // topic -> last seq seen, to spot missed events
+  const lastSeq = {}
+  // SSE id of the last event received (our position in every topic), sent as Last-Event-ID on reconnect
+  let lastEventId = null
 
   // Wrap each handler in a debounce so bursts collapse into a single refetch.
   // Handler values may be a plain function (uses DEBOUNCE_MS) or
   // { fn, debounceMs } to override the delay per-event.
   const debounced = {}
+  const patchers = {}
   for (const [name, entry] of Object.entries(handlers)) {
     const fn = typeof entry === 'function' ? entry : entry.fn
-    const delay = typeof entry === 'function' ? DEBOUNCE_MS : entry.debounceMs
+    const delay = typeof entry === 'function' ? DEBOUNCE_MS : (entry.debounceMs ?? DEBOUNCE_MS)
+    if (typeof entry !== 'function' && entry.patch) patchers[name] = entry.patch
     let t = null
     let lastData = null
     debounced[name] = (data) => {
@@ -71,6 +84,14 @@ export function useRealtime(topicsRef, handlers) {
     }, delayMs)
   }
 
+  // True if this event directly follows the last one seen on its topic.
+  function inSequence(data) {
+    if (!data || typeof data.seq !== 'number' || !data.topic) return true
+    const last = lastSeq[data.topic]
+    lastSeq[data.topic] = data.seq
+    return last === undefined || data.seq === last + 1
+  }
+
   function backfill() {
     // Fire each handler once with null so consumers refetch — covers
     // any events missed during a disconnect or visibility-pause.
@@ -93,7 +114,11 @@ export function useRealtime(topicsRef, handlers) {
     try {
       await fetchEventSource(url, {
         signal: ctrl.signal,
-        headers: { Authorization: `Bearer ${state.user.token}` },
+        headers: {
+          Authorization: `Bearer ${state.user.token}`,
+          // same (lowercase) key fetch-event-source updates itself on its own retries
+          ...(lastEventId ? { 'last-event-id': lastEventId } : {}),
+        },
         // We manage visibility ourselves — the library's default would
         // pause silently and accumulate stale state.
         openWhenHidden: false,
@@ -115,11 +140,25 @@ export function useRealtime(topicsRef, handlers) {
           throw new Error(`stream open failed: ${response.status}`)
         },
         onmessage(ev) {
-          const fn = debounced[ev.event]
-          if (!fn) return
+          if (ev.id) lastEventId = ev.id
           let parsed = null
           try { parsed = ev.data ? JSON.parse(ev.data) : null } catch {}
-          fn(parsed)
+          if (ev.event === 'resync') {
+            // the server could not replay everything we missed on this topic
+            if (parsed?.topic) delete lastSeq[parsed.topic]
+            backfill()
+            return
+          }
+          if (!inSequence(parsed)) {
+            backfill()  // refetches everything, this event included
+            return
+          }
+          const patch = patchers[ev.event]
+          if (patch && parsed?.patch) {
+            try { patch(parsed.patch, parsed); return } catch (e) { console.error(`realtime patch ${ev.event} threw`, e) }
+          }
+          const fn = debounced[ev.event]
+          if (fn) fn(parsed)
         },
         onerror(err) {
           // Returning a number tells fetch-event-source to retry after that
@@ -149,8 +188,7 @@ export function useRealtime(topicsRef, handlers) {
     if (typeof document !== 'undefined') {
       visibilityHandler = () => {
         if (document.visibilityState === 'visible') {
-          backfill()
-          open()
+          open()  // replays what was missed while hidden
         } else {
           close()
         }